@@ -0,0 +1,239 @@
+"""
+Avaliação paralela de modelos: roda a grade modelo × temperatura × cenário (× repetições)
+com limite de conversas simultâneas e de requisições por minuto por provedor, e grava
+um único arquivo de resultados (uma linha por turno) em CSV ou JSONL.
+
+    python Teste_LLM/avaliacao.py --temperaturas 0.0 0.3 0.7 --repeticoes 3 --saida resultados.csv
+    python Teste_LLM/avaliacao.py --provedor fake --saida resultados.jsonl   # sem rede
+
+Os modelos são os de teste_LLM.MODELOS ("gpt-4o" pela OpenAI, os demais pela OpenRouter).
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
+from server.llm.providers import create_llm
+from teste_LLM import MODELOS, MAX_TURNS, should_stop_conversation
+
+CENARIOS = [
+    {"nome": "camiseta", "loja": "roupas", "produto": "uma camiseta branca", "abertura": "Oi, estou procurando uma camiseta branca."},
+    {"nome": "tenis", "loja": "calçados", "produto": "um tênis de corrida", "abertura": "Olá, vocês têm tênis de corrida?"},
+    {"nome": "fone", "loja": "eletrônicos", "produto": "um fone de ouvido bluetooth", "abertura": "Oi, queria ver fones bluetooth."},
+]
+
+buyer_prompt = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template("""
+        Você é o Buyer (comprador) em uma loja de {loja} num shopping.
+        Não se identifique como IA.
+
+        Objetivo:
+        - Você quer comprar {produto} ou não.
+        - Você pode fazer até 3 perguntas.
+        - Se decidir comprar, diga claramente algo como "vou levar essa", "vou levar", "decidi levar".
+        - Se decidir não comprar, diga claramente algo como "não vou levar".
+        - Evite respostas ambíguas.
+    """),
+    HumanMessagePromptTemplate.from_template("""
+        Histórico da conversa até agora:
+        {history}
+
+        A última fala do Vendedor (Seller) foi:
+        {seller_utterance}
+
+        Agora responda como BUYER:
+        1. Lembre-se que você só pode fazer até 3 perguntas.
+        2. Se for decidir, diga algo claro como "vou levar" ou "não vou levar".
+    """)
+])
+
+seller_prompt = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template("""
+        Você é o Seller (vendedor) em uma loja de {loja} num shopping.
+        Não se identifique como IA.
+
+        Objetivo:
+        - Vender, responder perguntas do Buyer.
+        - Não encerre a conversa por conta própria.
+    """),
+    HumanMessagePromptTemplate.from_template("""
+        Histórico da conversa até agora:
+        {history}
+
+        A última fala do Comprador (Buyer) foi:
+        {buyer_utterance}
+
+        Agora responda como SELLER:
+        1. Ofereça informações sobre os produtos, preços etc.
+        2. Não se identifique como IA.
+        3. Não encerre por conta própria.
+    """)
+])
+
+CAMPOS = [
+    "modelo", "provedor", "temperatura", "cenario", "repeticao", "turno", "papel",
+    "latencia_s", "tokens_entrada", "tokens_saida", "texto", "decisao", "turnos_total", "erro",
+]
+
+def provedor_do_modelo(modelo: str) -> str:
+    return "openai" if modelo == "gpt-4o" else "openrouter"
+
+def decisao(historico: str) -> str:
+    if re.search(r"\b(não vou levar|decidi não levar)\b", historico, flags=re.IGNORECASE):
+        return "nao_comprou"
+    if should_stop_conversation(historico):
+        return "comprou"
+    return "sem_decisao"
+
+class LimiteTaxa:
+    """Espaça as requisições de um provedor para no máximo `rpm` por minuto (0 = sem limite)."""
+
+    def __init__(self, rpm: float):
+        self.intervalo = 60.0 / rpm if rpm > 0 else 0.0
+        self.proxima = 0.0
+        self._lock = asyncio.Lock()
+
+    async def aguardar(self):
+        if not self.intervalo:
+            return
+        async with self._lock:
+            agora = time.monotonic()
+            espera = self.proxima - agora
+            self.proxima = max(agora, self.proxima) + self.intervalo
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+async def conversa(modelo: str, provedor: str, temperatura: float, cenario: dict, repeticao: int, limite: LimiteTaxa, max_turnos: int) -> list:
+    llm = create_llm(temperature=temperatura, model_name=MODELOS[modelo], provider=provedor)
+    buyer_chain = buyer_prompt | llm
+    seller_chain = seller_prompt | llm
+
+    base = {"modelo": modelo, "provedor": provedor, "temperatura": temperatura, "cenario": cenario["nome"], "repeticao": repeticao}
+    linhas = [{**base, "turno": 1, "papel": "buyer", "latencia_s": 0.0, "tokens_entrada": 0, "tokens_saida": 0, "texto": cenario["abertura"]}]
+    historico = f"Buyer: {cenario['abertura']}\n"
+    buyer_utterance, seller_utterance = cenario["abertura"], ""
+
+    try:
+        for turno in range(2, max_turnos + 1):
+            if turno % 2 == 0:
+                papel, chain = "seller", seller_chain
+                entrada = {"loja": cenario["loja"], "history": historico, "buyer_utterance": buyer_utterance}
+            else:
+                papel, chain = "buyer", buyer_chain
+                entrada = {"loja": cenario["loja"], "produto": cenario["produto"], "history": historico, "seller_utterance": seller_utterance}
+
+            await limite.aguardar()
+            inicio = time.perf_counter()
+            resposta = await chain.ainvoke(entrada)
+            latencia = time.perf_counter() - inicio
+
+            uso = resposta.usage_metadata or {}
+            linhas.append({
+                **base, "turno": turno, "papel": papel, "latencia_s": round(latencia, 4),
+                "tokens_entrada": uso.get("input_tokens", 0), "tokens_saida": uso.get("output_tokens", 0),
+                "texto": resposta.content,
+            })
+            historico += f"{papel.capitalize()}: {resposta.content}\n"
+
+            if papel == "seller":
+                seller_utterance = resposta.content
+            else:
+                buyer_utterance = resposta.content
+                if should_stop_conversation(historico):
+                    break
+    except Exception as e:
+        linhas[-1]["erro"] = f"{type(e).__name__}: {e}"
+
+    resultado = decisao(historico)
+    for linha in linhas:
+        linha["decisao"] = resultado
+        linha["turnos_total"] = len(linhas)
+    return linhas
+
+class Saida:
+    """Grava as linhas de cada conversa assim que ela termina, em CSV ou JSONL pela extensão."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.csv = caminho.endswith(".csv")
+        self.arquivo = open(caminho, "w", encoding="utf-8", newline="")
+        if self.csv:
+            self.writer = csv.DictWriter(self.arquivo, fieldnames=CAMPOS)
+            self.writer.writeheader()
+
+    def gravar(self, linhas: list):
+        for linha in linhas:
+            linha = {campo: linha.get(campo, "") for campo in CAMPOS}
+            if self.csv:
+                self.writer.writerow(linha)
+            else:
+                self.arquivo.write(json.dumps(linha, ensure_ascii=False) + "\n")
+        self.arquivo.flush()
+
+    def fechar(self):
+        self.arquivo.close()
+
+async def avaliar(args) -> list:
+    cenarios = CENARIOS
+    if args.cenarios:
+        with open(args.cenarios, encoding="utf-8") as f:
+            cenarios = json.load(f)
+
+    grade = [
+        (modelo, temperatura, cenario, repeticao)
+        for modelo in args.modelos
+        for temperatura in args.temperaturas
+        for cenario in cenarios
+        for repeticao in range(1, args.repeticoes + 1)
+    ]
+    rpm = {"openai": args.rpm_openai, "openrouter": args.rpm_openrouter}
+    limites = defaultdict(lambda: LimiteTaxa(0))
+    limites.update({provedor: LimiteTaxa(valor) for provedor, valor in rpm.items()})
+    semaforo = asyncio.Semaphore(args.concorrencia)
+    saida = Saida(args.saida)
+    resumos = []
+
+    async def executar(modelo, temperatura, cenario, repeticao):
+        provedor = args.provedor or provedor_do_modelo(modelo)
+        async with semaforo:
+            linhas = await conversa(modelo, provedor, temperatura, cenario, repeticao, limites[provedor], args.max_turnos)
+        saida.gravar(linhas)
+        resumos.append(linhas[-1])
+        print(f"✅ {modelo} T={temperatura} {cenario['nome']} #{repeticao}: {linhas[-1]['decisao']} em {len(linhas)} turnos")
+
+    print(f"=== {len(grade)} conversas, até {args.concorrencia} simultâneas ===\n")
+    inicio = time.perf_counter()
+    try:
+        await asyncio.gather(*(executar(*item) for item in grade))
+    finally:
+        saida.fechar()
+    print(f"\n=== Fim em {time.perf_counter() - inicio:.1f}s. Resultados em {args.saida} ===")
+    return resumos
+
+def main():
+    parser = argparse.ArgumentParser(description="Avaliação paralela de modelos × temperaturas × cenários")
+    parser.add_argument("--modelos", nargs="+", default=list(MODELOS), choices=list(MODELOS))
+    parser.add_argument("--temperaturas", nargs="+", type=float, default=[0.3])
+    parser.add_argument("--cenarios", help="JSON com uma lista de cenários (nome, loja, produto, abertura)")
+    parser.add_argument("--repeticoes", type=int, default=1)
+    parser.add_argument("--max-turnos", type=int, default=MAX_TURNS)
+    parser.add_argument("--concorrencia", type=int, default=8, help="conversas simultâneas")
+    parser.add_argument("--rpm-openai", type=float, default=60, help="requisições por minuto na OpenAI (0 = sem limite)")
+    parser.add_argument("--rpm-openrouter", type=float, default=60, help="requisições por minuto na OpenRouter (0 = sem limite)")
+    parser.add_argument("--provedor", help="força um provedor para todos os modelos, ex.: fake")
+    parser.add_argument("--saida", default="logs/avaliacao.csv", help="arquivo .csv ou .jsonl")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+    asyncio.run(avaliar(args))
+
+if __name__ == "__main__":
+    main()
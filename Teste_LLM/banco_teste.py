@@ -0,0 +1,101 @@
+"""
+Banco de estoque local (SQLite) com as mesmas tabelas do banco da AWS:
+'lojas', 'loja_{numero}' para cada tipo de STORE_SCHEMA e 'posicao'.
+
+Uso: python Teste_LLM/banco_teste.py [caminho.db] [itens_por_loja]
+"""
+import os
+import random
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from server.db.schema import STORE_SCHEMA, NUMERIC_COLUMNS
+
+# Valores possíveis de cada coluna de texto, por tipo de loja
+VALORES = {
+    "Roupas": {
+        "produto": ["Camiseta", "Calça", "Jaqueta", "Bermuda", "Vestido", "Moletom"],
+        "tipo": ["Branca", "Preta", "Jeans", "Estampada", "Social", "Esportiva"],
+        "tamanho": ["P", "M", "G", "GG"],
+        "material": ["Algodão", "Poliéster", "Jeans", "Couro", "Linho"],
+        "estampa": ["Sim", "Não"],
+    },
+    "Jogos": {
+        "produto": ["FIFA 23", "Zelda", "Mario Kart", "Halo", "God of War", "Minecraft"],
+        "tipo": ["Esporte", "RPG", "Corrida", "Tiro", "Aventura"],
+        "console": ["Xbox", "PlayStation", "Switch", "PC"],
+    },
+    "Skate": {
+        "produto": ["Skate", "Shape", "Roda", "Rolamento", "Capacete", "Joelheira"],
+        "marca": ["Vans", "Thrasher", "Element", "Santa Cruz"],
+        "tipo": ["Street", "Longboard", "Proteção", "Peça"],
+        "cor": ["Preto", "Branco", "Azul", "Vermelho"],
+    },
+    "Tênis": {
+        "produto": ["Tênis", "Chinelo", "Bota", "Sapatênis"],
+        "marca": ["Nike", "Adidas", "Puma", "Mizuno"],
+        "tipo": ["Corrida", "Casual", "Basquete", "Skate"],
+        "cor": ["Branco", "Preto", "Azul", "Cinza"],
+    },
+    "WcDonalds": {
+        "produto": ["Cheeseburger", "Nuggets", "Batata Frita", "Milkshake", "Refrigerante"],
+        "tipo": ["Pequeno", "Médio", "Grande", "Combo"],
+    },
+    "Livros": {
+        "produto": ["Dom Casmurro", "O Hobbit", "Duna", "1984", "O Alquimista"],
+        "autor": ["Machado de Assis", "Tolkien", "Frank Herbert", "George Orwell", "Paulo Coelho"],
+        "genero": ["Romance", "Fantasia", "Ficção Científica", "Distopia"],
+        "idioma": ["Português", "Inglês"],
+    },
+    "Eletronicos": {
+        "produto": ["Fone de Ouvido", "Smartphone", "Notebook", "Carregador", "Caixa de Som"],
+        "tipo": ["Bluetooth", "Gamer", "Portátil", "Sem Fio"],
+        "marca": ["Samsung", "Apple", "JBL", "Lenovo"],
+        "garantia": ["6 meses", "1 ano", "2 anos"],
+    },
+}
+
+def criar_banco(path: str, itens_por_loja: int = 200, seed: int = 42) -> str:
+    """Cria (ou recria) o banco em `path` e retorna a DATABASE_URL correspondente."""
+    if os.path.exists(path):
+        os.remove(path)
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE lojas (id INTEGER PRIMARY KEY, tipo TEXT, numero NUMERIC)")
+    conn.execute("CREATE TABLE posicao (numero NUMERIC, x REAL, y REAL, z REAL)")
+
+    for i, (tipo, colunas) in enumerate(STORE_SCHEMA.items(), start=1):
+        numero = i * 100
+        conn.execute("INSERT INTO lojas (id, tipo, numero) VALUES (?, ?, ?)", (i, tipo, numero))
+        conn.execute("INSERT INTO posicao VALUES (?, ?, ?, ?)", (numero, rng.uniform(0, 50), 0.0, rng.uniform(0, 50)))
+
+        definicoes = ", ".join(f"{col} {'NUMERIC' if col in NUMERIC_COLUMNS else 'TEXT'}" for col in colunas)
+        conn.execute(f"CREATE TABLE loja_{numero} (id INTEGER PRIMARY KEY, {definicoes})")
+
+        valores = VALORES[tipo]
+        linhas = []
+        for _ in range(itens_por_loja):
+            linha = []
+            for col in colunas:
+                if col == "qtd":
+                    linha.append(rng.randint(0, 30))
+                elif col == "preco":
+                    linha.append(round(rng.uniform(10, 900), 2))
+                else:
+                    linha.append(rng.choice(valores[col]))
+            linhas.append(linha)
+
+        marcadores = ", ".join("?" for _ in colunas)
+        conn.executemany(f"INSERT INTO loja_{numero} ({', '.join(colunas)}) VALUES ({marcadores})", linhas)
+
+    conn.commit()
+    conn.close()
+    return f"sqlite:///{os.path.abspath(path)}"
+
+if __name__ == "__main__":
+    caminho = sys.argv[1] if len(sys.argv) > 1 else "estoque_teste.db"
+    itens = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    print(criar_banco(caminho, itens))
@@ -0,0 +1,115 @@
+"""
+Micro-benchmark das consultas por preço de get_matching_items: banco (reference_price_query +
+price_band_query via fetch_all) contra o PriceIndex em memória.
+
+Sem DATABASE_URL, gera um banco SQLite com banco_teste.py:
+
+    python Teste_LLM/benchmark_preco.py --itens-por-loja 5000 --repeticoes 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+def medir(repeticoes: int, func) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        func()
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+async def medir_async(repeticoes: int, func) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        await func()
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+async def benchmark(loja: str, repeticoes: int):
+    from sqlalchemy import func
+    from server.db.engine import fetch_all, async_engine
+    from server.db.query_builder import reference_price_query, price_band_query, stock_query, _loja
+    from server.db.queries import load_stock, rows_to_items
+    from server.db.directory import find_all_stores
+    from server.db.schema import columns_for
+    from server.db.stock_index import StockIndex
+    from server.db.price_index import PriceIndex
+
+    stores = await find_all_stores()
+    numero = stores[loja][0]
+    colunas = columns_for(loja)
+    itens = tuple(await load_stock(numero, colunas))
+    tabela = _loja(numero, colunas)
+
+    inicio = time.perf_counter()
+    indice = StockIndex(itens)
+    precos = PriceIndex(itens)
+    construcao = (time.perf_counter() - inicio) * 1000
+
+    produto = itens[0]["produto"].lower()
+    rng = random.Random(7)
+    alvo = rng.uniform(float(precos.prices[0]), float(precos.prices[-1]))
+
+    # Caminho antigo: preço de referência + faixa de ±20%, ambos no banco
+    async def faixa_banco():
+        linhas = await fetch_all(reference_price_query(numero, produto))
+        referencia = float(linhas[0][0]) if linhas else 250.0
+        return rows_to_items(await fetch_all(price_band_query(numero, colunas, referencia * 0.8, referencia * 1.2)), colunas)
+
+    def faixa_memoria():
+        referencia = indice.match({"produto": produto})
+        referencia = float(referencia[0]["preco"]) if referencia else 250.0
+        return precos.band(referencia * 0.8, referencia * 1.2)
+
+    async def mais_barato_banco():
+        query = stock_query(numero, colunas).where(tabela.c.preco <= alvo).order_by(tabela.c.preco.asc()).limit(10)
+        return rows_to_items(await fetch_all(query), colunas)
+
+    async def mais_proximo_banco():
+        query = stock_query(numero, colunas).order_by(func.abs(tabela.c.preco - alvo)).limit(5)
+        return rows_to_items(await fetch_all(query), colunas)
+
+    # Mesmo resultado nos dois caminhos (preços), antes de medir. A referência do fallback
+    # pode diferir: o banco aceita um item sem estoque, o índice só tem itens em estoque
+    banda = rows_to_items(await fetch_all(price_band_query(numero, colunas, alvo * 0.8, alvo * 1.2)), colunas)
+    assert [i["preco"] for i in banda] == [i["preco"] for i in precos.band(alvo * 0.8, alvo * 1.2)]
+    assert [i["preco"] for i in await mais_barato_banco()] == [i["preco"] for i in precos.cheapest_under(alvo, 10)]
+    assert sorted(i["preco"] for i in await mais_proximo_banco()) == sorted(i["preco"] for i in precos.nearest(alvo, 5))
+
+    casos = [
+        ("faixa de preço (fallback)", faixa_banco, faixa_memoria),
+        ("mais barato até max_price", mais_barato_banco, lambda: precos.cheapest_under(alvo, 10)),
+        ("preço mais próximo (k=5)", mais_proximo_banco, lambda: precos.nearest(alvo, 5)),
+    ]
+
+    print(f"Loja {loja} (loja_{numero}): {len(itens)} itens em estoque, índices montados em {construcao:.1f} ms\n")
+    print(f"{'consulta':<30}{'banco ms':>12}{'memória ms':>14}{'ganho':>10}")
+    for nome, banco, memoria in casos:
+        t_banco = await medir_async(repeticoes, banco)
+        t_memoria = medir(repeticoes, memoria)
+        print(f"{nome:<30}{t_banco:>12.3f}{t_memoria:>14.4f}{t_banco / t_memoria:>9.0f}x")
+
+    await async_engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das consultas por preço: banco x PriceIndex")
+    parser.add_argument("--loja", default="Roupas", help="tipo da loja, como na tabela 'lojas' (sem acento)")
+    parser.add_argument("--itens-por-loja", type=int, default=2000, help="itens por loja no banco gerado")
+    parser.add_argument("--repeticoes", type=int, default=100)
+    args = parser.parse_args()
+
+    # Só o banco é exercitado; o provedor fake evita exigir chave de API ao importar as chains
+    os.environ.setdefault("LLM_PROVIDER", "fake")
+    if not os.getenv("DATABASE_URL"):
+        from banco_teste import criar_banco
+        os.environ["DATABASE_URL"] = criar_banco(os.path.join(tempfile.mkdtemp(prefix="benchmark_preco_"), "estoque.db"), args.itens_por_loja)
+
+    asyncio.run(benchmark(args.loja, args.repeticoes))
+
+if __name__ == "__main__":
+    main()
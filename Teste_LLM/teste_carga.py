@@ -0,0 +1,253 @@
+"""
+Teste de carga do protocolo websocket (/ws/{agent_id}).
+
+Simula N clientes Unity em paralelo, cada um percorrendo o fluxo completo
+(start, setBuyerPreferences, guide_request, store_request, buyer_message, get_summary),
+e mede vazão e percentis de latência por ação.
+
+Sem --url, sobe o servidor localmente com o provedor de LLM "fake" e um banco
+SQLite gerado por banco_teste.py, sem rede nem chaves de API:
+
+    python Teste_LLM/teste_carga.py --clientes 50 --conversas 2 --latencia 0.3
+
+Com --url, usa um servidor já em execução (o LLM e o banco são os dele).
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+import websockets
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from server.utils.tracing import percentile
+
+PREFERENCIAS = {
+    "desired_item": ["camiseta branca", "tênis nike", "fone de ouvido bluetooth"],
+    "max_price": [80, 700, 300],
+    "interests": "comida, skate, jogos",
+}
+
+class Medidor:
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.erros = defaultdict(int)
+
+    def registrar(self, acao: str, segundos: float):
+        self.latencias[acao].append(segundos)
+
+    def erro(self, acao: str):
+        self.erros[acao] += 1
+
+    def relatorio(self, duracao: float) -> dict:
+        acoes = {}
+        for acao in sorted(set(self.latencias) | set(self.erros)):
+            valores = sorted(self.latencias.get(acao, []))
+            acoes[acao] = {
+                "n": len(valores),
+                "erros": self.erros.get(acao, 0),
+                "req_s": len(valores) / duracao if duracao else 0.0,
+                "p50_ms": percentile(valores, 0.50) * 1000,
+                "p90_ms": percentile(valores, 0.90) * 1000,
+                "p99_ms": percentile(valores, 0.99) * 1000,
+                "max_ms": (valores[-1] if valores else 0.0) * 1000,
+            }
+        # "acao:primeiro_token" é uma medida dentro da mesma requisição, não outra requisição
+        total = sum(m["n"] for acao, m in acoes.items() if ":" not in acao)
+        return {"duracao_s": duracao, "requisicoes": total, "req_s": total / duracao if duracao else 0.0, "acoes": acoes}
+
+class Cliente:
+    """Um agente Unity simulado: uma websocket e o fluxo de mensagens do jogo."""
+
+    def __init__(self, url: str, agent_id: str, medidor: Medidor, stream: bool, timeout: float):
+        self.url = f"{url}/ws/{agent_id}"
+        self.agent_id = agent_id
+        self.medidor = medidor
+        self.stream = stream
+        self.timeout = timeout
+        self.ws = None
+        self.contador = 0
+
+    def _request_id(self) -> str:
+        self.contador += 1
+        return f"{self.agent_id}-{self.contador}"
+
+    async def _receber(self, acao: str, inicio: float, aceita):
+        # Frames fora de ordem (ex.: interestMap em segundo plano) são ignorados
+        primeiro_token = False
+        while True:
+            frame = json.loads(await asyncio.wait_for(self.ws.recv(), self.timeout))
+            if frame.get("done") is False:
+                if not primeiro_token:
+                    self.medidor.registrar(f"{acao}:primeiro_token", time.perf_counter() - inicio)
+                    primeiro_token = True
+                continue
+            if aceita(frame):
+                return frame
+
+    async def enviar(self, acao: str, resposta: bool = True, **campos):
+        request_id = self._request_id()
+        mensagem = {"action": acao, "request_id": request_id, **campos}
+        if self.stream:
+            mensagem["stream"] = True
+
+        inicio = time.perf_counter()
+        try:
+            await self.ws.send(json.dumps(mensagem))
+            if not resposta:
+                return None
+            if acao == "start":
+                frame = await self._receber(acao, inicio, lambda f: "message" in f)
+            elif acao == "setBuyerPreferences":
+                frame = await self._receber(acao, inicio, lambda f: "response" in f)
+            else:
+                frame = await self._receber(acao, inicio, lambda f: f.get("request_id") == request_id and f.get("action") != "interestMap")
+        except Exception:
+            self.medidor.erro(acao)
+            raise
+        self.medidor.registrar(acao, time.perf_counter() - inicio)
+        return frame
+
+    async def conversa(self, turnos: int, pausa: float):
+        await self.enviar("start")
+        await self.enviar("setBuyerPreferences", **PREFERENCIAS)
+
+        for _ in PREFERENCIAS["desired_item"]:
+            guia = await self.enviar("guide_request")
+            loja = guia.get("answer", "")
+            tipo = loja.split("tipo='")[1].split("'")[0] if "tipo='" in loja else "Roupas"
+            # Tempo de caminhada do avatar até a loja
+            await asyncio.sleep(pausa)
+
+            fala = "Olá, estou procurando o que pedi no balcão."
+            conversa = []
+            for _ in range(turnos):
+                vendedor = await self.enviar("store_request", prompt=fala, store_description=tipo)
+                resposta = vendedor.get("answer", "")
+                comprador = await self.enviar("buyer_message", prompt=resposta)
+                fala = comprador.get("answer", fala)
+                conversa += [f"Seller: {resposta}", f"Buyer: {fala}"]
+
+            await self.enviar("get_summary", conversa="\n".join(conversa))
+            await self.enviar("nextProduct", resposta=False)
+
+    async def rodar(self, conversas: int, turnos: int, pausa: float):
+        async with websockets.connect(self.url, max_size=None) as ws:
+            self.ws = ws
+            for _ in range(conversas):
+                await self.conversa(turnos, pausa)
+
+async def carga(url: str, clientes: int, conversas: int, turnos: int, pausa: float, rampa: float, stream: bool, timeout: float) -> dict:
+    medidor = Medidor()
+
+    async def iniciar(i: int):
+        await asyncio.sleep(rampa * i / max(clientes, 1))
+        cliente = Cliente(url, f"carga-{i}", medidor, stream, timeout)
+        try:
+            await cliente.rodar(conversas, turnos, pausa)
+        except Exception as e:
+            print(f"[carga-{i}] Cliente interrompido: {type(e).__name__}: {e}")
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(iniciar(i) for i in range(clientes)))
+    return medidor.relatorio(time.perf_counter() - inicio)
+
+def imprimir(relatorio: dict):
+    print(f"\nDuração: {relatorio['duracao_s']:.2f}s | Requisições: {relatorio['requisicoes']} | Vazão: {relatorio['req_s']:.1f} req/s\n")
+    print(f"{'ação':<32}{'n':>7}{'erros':>7}{'req/s':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for acao, m in relatorio["acoes"].items():
+        print(f"{acao:<32}{m['n']:>7}{m['erros']:>7}{m['req_s']:>9.1f}{m['p50_ms']:>10.1f}{m['p90_ms']:>10.1f}{m['p99_ms']:>10.1f}{m['max_ms']:>10.1f}")
+
+def subir_servidor(args, pasta: str):
+    from banco_teste import criar_banco
+
+    env = dict(os.environ)
+    env["DATABASE_URL"] = criar_banco(os.path.join(pasta, "estoque.db"), args.itens_por_loja)
+    env["LLM_PROVIDER"] = "fake"
+    env["FAKE_LLM_LATENCY"] = str(args.latencia)
+    env["FAKE_LLM_TOKEN_RATE"] = str(args.tokens_por_segundo)
+    env["FAKE_LLM_JITTER"] = str(args.variacao)
+    if args.roteiro:
+        env["FAKE_LLM_SCRIPT"] = os.path.abspath(args.roteiro)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [RAIZ, env.get("PYTHONPATH")]))
+
+    log = open(os.path.join(pasta, "servidor.log"), "w", encoding="utf-8")
+    processo = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server.main:app",
+         "--host", "127.0.0.1", "--port", str(args.porta), "--log-level", "warning"],
+        cwd=RAIZ, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+    url = f"http://127.0.0.1:{args.porta}"
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError(f"Servidor local encerrou ao iniciar; veja {log.name}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return processo, url, log
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    processo.terminate()
+    raise RuntimeError("Servidor local não respondeu em 60s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do websocket do servidor")
+    parser.add_argument("--url", help="servidor já em execução, ex.: http://localhost:8000")
+    parser.add_argument("--clientes", type=int, default=10, help="clientes simultâneos")
+    parser.add_argument("--conversas", type=int, default=1, help="conversas completas por cliente")
+    parser.add_argument("--turnos", type=int, default=2, help="pares store_request/buyer_message por loja")
+    parser.add_argument("--pausa", type=float, default=0.0, help="caminhada (s) entre guide_request e store_request")
+    parser.add_argument("--rampa", type=float, default=1.0, help="segundos para conectar todos os clientes")
+    parser.add_argument("--stream", action="store_true", help="pede respostas em stream e mede o primeiro token")
+    parser.add_argument("--timeout", type=float, default=120.0, help="espera máxima (s) por resposta")
+    parser.add_argument("--latencia", type=float, default=0.2, help="LLM falso: segundos até o primeiro token")
+    parser.add_argument("--tokens-por-segundo", type=float, default=50.0, help="LLM falso: tokens por segundo")
+    parser.add_argument("--variacao", type=float, default=0.0, help="LLM falso: variação da latência (fração, fixa por prompt)")
+    parser.add_argument("--roteiro", help="LLM falso: arquivo JSON/JSONL com respostas {\"match\", \"response\"}")
+    parser.add_argument("--itens-por-loja", type=int, default=200, help="linhas por tabela loja_N no banco local")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--saida", help="arquivo JSON com o relatório e as métricas do servidor")
+    args = parser.parse_args()
+
+    processo = log = None
+    pasta = tempfile.mkdtemp(prefix="teste_carga_")
+    url = args.url
+    if url is None:
+        processo, url, log = subir_servidor(args, pasta)
+        print(f"Servidor local em {url} (log: {log.name})")
+
+    try:
+        ws_url = url.replace("http://", "ws://").replace("https://", "wss://")
+        relatorio = asyncio.run(carga(ws_url, args.clientes, args.conversas, args.turnos, args.pausa, args.rampa, args.stream, args.timeout))
+        imprimir(relatorio)
+
+        try:
+            relatorio["servidor"] = httpx.get(f"{url}/metrics", timeout=10).json()
+        except Exception as e:
+            print(f"Métricas do servidor indisponíveis: {e}")
+
+        if args.saida:
+            with open(args.saida, "w", encoding="utf-8") as f:
+                json.dump(relatorio, f, ensure_ascii=False, indent=2)
+            print(f"\nRelatório salvo em {args.saida}")
+    finally:
+        if processo is not None:
+            processo.terminate()
+            processo.wait(timeout=10)
+            log.close()
+        shutil.rmtree(pasta, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
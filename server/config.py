@@ -7,3 +7,93 @@ OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME", "gpt-4o")
 DB_URI = os.getenv("DATABASE_URL")
 
 
+
+# Threads reservados para chamadas bloqueantes (chains sem caminho assíncrono, I/O síncrono)
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "16"))
+
+# Pool do engine assíncrono (banco de estoque remoto)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
+
+# Roteamento local de lojas: abaixo desta confiança o guia volta a consultar o LLM
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.5"))
+
+# Cache compartilhado de estoque por loja
+STOCK_CACHE_TTL = float(os.getenv("STOCK_CACHE_TTL", "300"))
+STOCK_CACHE_MAX_STORES = int(os.getenv("STOCK_CACHE_MAX_STORES", "64"))
+# Execuções de um mesmo statement antes do psycopg prepará-lo no servidor
+DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD", "2"))
+
+# Memo de atributos extraídos dos pedidos (extract_filters)
+ATTR_CACHE_SIZE = int(os.getenv("ATTR_CACHE_SIZE", "1024"))
+ATTR_CACHE_PATH = os.getenv("ATTR_CACHE_PATH", "")
+
+# Histórico das conversas: acima de HISTORY_MAX_TURNS falas (0 = sem limite), as mais antigas
+# são resumidas (ou descartadas, se HISTORY_SUMMARIZE=false) e só as últimas HISTORY_KEEP_TURNS ficam literais
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "16"))
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "8"))
+HISTORY_SUMMARIZE = os.getenv("HISTORY_SUMMARIZE", "true").lower() == "true"
+
+# Sessões: limite de agentes simultâneos e expiração por inatividade
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))
+SESSION_EVICT_INTERVAL = float(os.getenv("SESSION_EVICT_INTERVAL", "60"))
+
+# Onde o estado das sessões é persistido: "memory" (padrão, um único worker) ou
+# "sqlite:///caminho/sessions.db" (compartilhado entre workers e reinícios)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+
+# Intervalo (s) entre verificações de mudança na tabela 'lojas'
+STORE_DIRECTORY_POLL_INTERVAL = float(os.getenv("STORE_DIRECTORY_POLL_INTERVAL", "30"))
+
+# Índice espacial das lojas ('posicao'): lado (em unidades da cena) de cada célula da grade;
+# 0 escolhe automaticamente, com cerca de uma loja por célula
+STORE_MAP_CELL_SIZE = float(os.getenv("STORE_MAP_CELL_SIZE", "0"))
+# Intervalo (s) entre verificações de mudança na tabela 'posicao'
+STORE_MAP_POLL_INTERVAL = float(os.getenv("STORE_MAP_POLL_INTERVAL", "30"))
+
+# Tracing: amostras por span usadas nos percentis e spans recentes guardados para consulta
+TRACE_SAMPLE_SIZE = int(os.getenv("TRACE_SAMPLE_SIZE", "2048"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "5000"))
+
+# Cache das decisões do interestChecker_chain
+INTEREST_CACHE_SIZE = int(os.getenv("INTEREST_CACHE_SIZE", "4096"))
+INTEREST_FUZZY_THRESHOLD = float(os.getenv("INTEREST_FUZZY_THRESHOLD", "0.8"))
+INTEREST_PRECOMPUTE = os.getenv("INTEREST_PRECOMPUTE", "true").lower() == "true"
+
+# Busca o estoque da loja indicada no guide_request enquanto o avatar caminha até ela
+STOCK_PREFETCH = os.getenv("STOCK_PREFETCH", "true").lower() == "true"
+
+# Provedor dos modelos de linguagem (ver server/llm/providers.py): "openai" (padrão),
+# "openrouter" ou "fake" (determinístico, sem rede, para testes de carga e profiling)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+# Provedor fake: segundos até o primeiro token, tokens/s depois dele (0 = sem espera),
+# variação da latência (fração, fixa por prompt) e arquivo de respostas roteirizadas
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0"))
+FAKE_LLM_TOKEN_RATE = float(os.getenv("FAKE_LLM_TOKEN_RATE", "0"))
+FAKE_LLM_JITTER = float(os.getenv("FAKE_LLM_JITTER", "0"))
+FAKE_LLM_SCRIPT = os.getenv("FAKE_LLM_SCRIPT", "")
+
+# Gravação/reprodução das chamadas ao LLM (ver server/llm/replay.py):
+# "passthrough" (padrão), "record" ou "replay", gravadas no SQLite em LLM_REPLAY_PATH
+LLM_REPLAY_MODE = os.getenv("LLM_REPLAY_MODE", "passthrough")
+LLM_REPLAY_PATH = os.getenv("LLM_REPLAY_PATH", "llm_replay.db")
+
+# Controle de admissão das chamadas ao LLM (ver server/llm/admission.py): chamadas
+# simultâneas no total (0 = sem limite), requisições/minuto por modelo ("gpt-4o=500,...")
+# e padrão para os demais (0 = sem limite), rajada do token bucket e pausa após um 429
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "")
+LLM_DEFAULT_RPM = float(os.getenv("LLM_DEFAULT_RPM", "0"))
+LLM_RATE_BURST = float(os.getenv("LLM_RATE_BURST", "10"))
+LLM_RATE_LIMIT_BACKOFF = float(os.getenv("LLM_RATE_LIMIT_BACKOFF", "5"))
+
+# Índice de trigramas do estoque: fração mínima dos trigramas do pedido que um item
+# precisa ter para entrar na busca aproximada de get_matching_items
+STOCK_INDEX_MIN_SCORE = float(os.getenv("STOCK_INDEX_MIN_SCORE", "0.6"))
@@ -0,0 +1,111 @@
+import json
+import os
+from collections import OrderedDict
+from server.config import ATTR_CACHE_SIZE, ATTR_CACHE_PATH
+from server.db.schema import NUMERIC_COLUMNS
+from server.utils.executor import run_blocking
+from server.utils.text import normalizar, tokenize
+
+class AttributeMemo:
+    """
+    LRU de pedido normalizado -> {coluna: valor}. Se `path` for informado, cada
+    entrada nova é acrescentada a um arquivo JSONL e recarregada no próximo start.
+    """
+
+    def __init__(self, max_entries: int, path: str = ""):
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self._load()
+
+    @staticmethod
+    def key(buyer_request: str, columns) -> str:
+        return f"{','.join(columns)}|{' '.join(normalizar(buyer_request).split())}"
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(value)
+
+    async def put(self, key, value: dict):
+        self._store(key, dict(value))
+        if self.path:
+            await run_blocking(self._append, key, value)
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _append(self, key, value):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "value": value}, ensure_ascii=False) + "\n")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        # Arquivos antigos podem ter extrações vazias, que virariam "todo o estoque"
+                        if entry["value"]:
+                            self._store(entry["key"], dict(entry["value"]))
+                    except (ValueError, KeyError, TypeError):
+                        continue
+            print(f"[AttributeMemo] {len(self._entries)} pedidos carregados de {self.path}")
+        except OSError as e:
+            print(f"[AttributeMemo] Erro ao ler {self.path}: {e}")
+
+attribute_memo = AttributeMemo(max_entries=ATTR_CACHE_SIZE, path=ATTR_CACHE_PATH)
+
+def build_vocabulary(stock_items) -> dict:
+    """Vocabulário do estoque de uma loja: token -> {(coluna, valor original)}."""
+    vocabulary = {}
+    for item in stock_items:
+        for campo, valor in item.items():
+            if campo in NUMERIC_COLUMNS or valor is None:
+                continue
+            for token in tokenize(valor):
+                vocabulary.setdefault(token, set()).add((campo, str(valor)))
+    return vocabulary
+
+def extract_by_rules(buyer_request: str, vocabulary: dict, columns) -> dict | None:
+    """
+    Extrator sem LLM: só responde se TODO token do pedido corresponder a um único
+    valor conhecido do estoque. Caso contrário retorna None e o LLM decide.
+    """
+    tokens = tokenize(buyer_request)
+    if not tokens:
+        return None
+
+    atributos = {}
+    for token in tokens:
+        candidatos = {(campo, valor) for campo, valor in vocabulary.get(token, ()) if campo in columns}
+        if not candidatos:
+            return None
+        campos = {campo for campo, _ in candidatos}
+        if len(campos) != 1:
+            return None
+        campo = campos.pop()
+        valores = {valor for _, valor in candidatos}
+        if len(valores) == 1:
+            valor = valores.pop()
+        else:
+            # Token compartilhado por vários valores da mesma coluna ("air" em "Air Max"/"Air Force"):
+            # filtra pelo próprio token
+            valor = token
+        if campo in atributos and atributos[campo] != valor:
+            return None
+        atributos[campo] = valor
+
+    return atributos
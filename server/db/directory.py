@@ -0,0 +1,32 @@
+from types import MappingProxyType
+from server.config import STORE_DIRECTORY_POLL_INTERVAL
+from server.db.engine import fetch_all
+from server.db.query_builder import stores_query, stores_checksum_query
+from server.db.router import build_store_router
+from server.db.snapshot import PolledSnapshot
+from server.utils.text import remove_acentos
+
+async def find_all_stores() -> dict:
+    """
+    Find all stores in the database.
+    Returns {tipo (accent-free): (numero, id)}.
+    """
+    rows = await fetch_all(stores_query())
+    return {remove_acentos(row[0]): (row[1], row[2]) for row in rows}
+
+class StoreDirectory(PolledSnapshot):
+    """Diretório de lojas ({tipo: (numero, id)}) recarregado quando a tabela 'lojas' muda."""
+
+    def __init__(self):
+        super().__init__(MappingProxyType({}), STORE_DIRECTORY_POLL_INTERVAL)
+
+    def checksum_query(self):
+        return stores_checksum_query()
+
+    async def build(self):
+        stores = await find_all_stores()
+        await build_store_router(stores)
+        print("stores:", stores)
+        return MappingProxyType(stores)
+
+store_directory = StoreDirectory()
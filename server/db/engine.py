@@ -1,6 +1,64 @@
 from sqlalchemy.ext.asyncio import create_async_engine
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 
-from server.config import DB_URI
+from server.utils.tracing import tracer
+from server.config import (
+    DB_URI,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_POOL_TIMEOUT,
+    DB_STATEMENT_TIMEOUT_MS,
+    DB_PREPARE_THRESHOLD,
+)
 
+# Engine síncrono: usado apenas pelo SQLDatabase do LangChain
 engine = create_engine(DB_URI, pool_pre_ping=True)
+
+# Drivers assíncronos equivalentes aos drivers síncronos da DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+psycopg",
+    "postgresql+psycopg2": "postgresql+psycopg",
+    "postgresql+psycopg": "postgresql+psycopg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_url(uri: str):
+    url = make_url(uri)
+    driver = ASYNC_DRIVERS.get(url.drivername, url.drivername)
+    return url.set(drivername=driver)
+
+def engine_options(url) -> dict:
+    if url.get_backend_name() == "sqlite":
+        return {}
+
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": True,
+        "connect_args": {
+            "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}",
+            "prepare_threshold": DB_PREPARE_THRESHOLD,
+        },
+    }
+
+_async_url = async_url(DB_URI)
+async_engine = create_async_engine(_async_url, **engine_options(_async_url))
+
+async def fetch_all(statement, params=None):
+    """
+    Executa uma consulta no engine assíncrono e retorna todas as linhas.
+    Aceita SQL em texto ou um statement do SQLAlchemy.
+    """
+    if isinstance(statement, str):
+        statement = text(statement)
+
+    with tracer.span("sql", statement=str(statement).split("\n", 1)[0][:120]) as span:
+        async with async_engine.connect() as conn:
+            result = await conn.execute(statement, params or {})
+            rows = result.fetchall()
+        span.attrs["rows"] = len(rows)
+        return rows
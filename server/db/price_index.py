@@ -0,0 +1,47 @@
+import numpy as np
+
+class PriceIndex:
+    """
+    Itens em estoque de uma loja ordenados por preço, com os preços num array NumPy
+    para responder faixas de preço e vizinhança por busca binária.
+    """
+
+    def __init__(self, items):
+        items = [item for item in items if item.get("preco") is not None]
+        prices = np.fromiter((float(item["preco"]) for item in items), dtype=np.float64, count=len(items))
+        order = np.argsort(prices, kind="stable")
+        self.prices = prices[order]
+        self.items = tuple(items[i] for i in order)
+
+    def __len__(self):
+        return len(self.items)
+
+    def band(self, min_price: float, max_price: float) -> list:
+        """Itens com min_price <= preco <= max_price, do mais barato ao mais caro (BETWEEN ... ORDER BY preco)."""
+        start = np.searchsorted(self.prices, min_price, side="left")
+        end = np.searchsorted(self.prices, max_price, side="right")
+        return list(self.items[start:end])
+
+    def cheapest_under(self, max_price: float, limit: int = None) -> list:
+        """Itens com preco <= max_price, começando pelo mais barato."""
+        end = np.searchsorted(self.prices, max_price, side="right")
+        if limit is not None:
+            end = min(end, limit)
+        return list(self.items[:end])
+
+    def nearest(self, price: float, k: int = 1) -> list:
+        """Os `k` itens de preço mais próximo de `price`, do mais próximo ao mais distante."""
+        n = len(self.prices)
+        k = min(k, n)
+        right = int(np.searchsorted(self.prices, price))
+        left = right - 1
+        result = []
+        # Duas pontas a partir do ponto de inserção, como num merge
+        while len(result) < k:
+            if right >= n or (left >= 0 and price - self.prices[left] <= self.prices[right] - price):
+                result.append(self.items[left])
+                left -= 1
+            else:
+                result.append(self.items[right])
+                right += 1
+        return result
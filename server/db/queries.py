@@ -1,21 +1,31 @@
 from langchain_community.utilities import SQLDatabase
 from langchain_experimental.sql import SQLDatabaseChain
 from langchain.prompts import PromptTemplate
-from sqlalchemy import text
-from server.db.engine import engine
-from server.config import OPENAI_API_KEY, OPENAI_MODEL_NAME
-from langchain_openai import ChatOpenAI
-from server.utils.memory import agent_cache, productIndex, stores
+from server.db.engine import engine, fetch_all
+from server.llm.providers import create_llm
+from server.db.directory import store_directory
 from server.llm.prompts import prompt_loja_prompt, prompt_loja_fallback_chain
 from langchain.chains import LLMChain
-import unicodedata
+from server.utils.executor import run_blocking
+from server.utils.text import remove_acentos
+from server.utils.tracing import tracer, traced
+from server.db.router import store_router
+from server.db.stock_cache import stock_cache
+from server.db.schema import columns_for
+from server.db.attributes import attribute_memo, extract_by_rules
+from server.db.store_stock import StoreStock
+from server.db.store_map import store_map
+from server.db.query_builder import stock_query
+from server.config import ROUTER_MIN_CONFIDENCE, STOCK_INDEX_MIN_SCORE
+import asyncio
+import functools
 import time
 import json
 
 # Setup
 
 database = SQLDatabase(engine)
-llm = ChatOpenAI(model_name=OPENAI_MODEL_NAME, openai_api_key=OPENAI_API_KEY, temperature=0.0)
+llm = create_llm(temperature=0.0)
 
 # Novo prompt limpo (sem explicações, sem markdown)
 CUSTOM_SQL_PROMPT = """
@@ -105,9 +115,23 @@ SQLQuery:
 """
 
 def medir_tempo(func):
+    # Além do print, cada chamada vira um span com o nome da função (ver /metrics)
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start_time = time.perf_counter()
+            with tracer.span(func.__name__):
+                resultado = await func(*args, **kwargs)
+            elapsed_time = time.perf_counter() - start_time
+            print(f"[{func.__name__}] Tempo de execução: {elapsed_time:.3f} segundos")
+            return resultado
+        return async_wrapper
+
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
         start_time = time.perf_counter()
-        resultado = func(*args, **kwargs)
+        with tracer.span(func.__name__):
+            resultado = func(*args, **kwargs)
         elapsed_time = time.perf_counter() - start_time
         print(f"[{func.__name__}] Tempo de execução: {elapsed_time:.3f} segundos")
         return resultado
@@ -118,50 +142,27 @@ sql_prompt = PromptTemplate(
     template=CUSTOM_SQL_PROMPT,
 )
 
-sql_chain = SQLDatabaseChain.from_llm(
+sql_chain = traced(SQLDatabaseChain.from_llm(
     llm=llm,
     db=database,
     prompt=sql_prompt,
     verbose=True  # shows prompt, SQL, and results in terminal
-)
-
-def remove_acentos(texto):
-    return ''.join(
-        c for c in unicodedata.normalize('NFKD', texto)
-        if not unicodedata.combining(c)
-    )
+), "sql_chain")
 
-def find_all_stores():
-    """
-    Find all stores in the database and return them as a list of tuples.
-    Each tuple contains (id, tipo, numero).
-    """
-    query = "SELECT tipo, numero, id FROM lojas"
-    try:
-        with engine.connect() as conn:
-            result_proxy = conn.execute(text(query))
-            rows = result_proxy.fetchall()
-            for row in rows:
-                store_tipo = remove_acentos(row[0])
-                store_num = row[1]
-                store_id = row[2]
-                stores[store_tipo] = [store_num, store_id]
-            print("stores:", stores)
-            return
-    except Exception as e:
-        print(f"[find_all_stores] Error: {e}")
-        return
-    
 @medir_tempo
-def search_database(nl_query: str):
+async def search_database(nl_query: str):
     """
     Use the sql_chain to turn natural language into SQL, then execute it.
     Returns (sql_text, rows).
 
+    Only for genuinely free-form questions: known queries on lojas, loja_{numero}
+    and posicao go through server/db/query_builder.py and fetch_all directly.
+
     Also sanitizes the output to remove triple backticks or "SQLQuery:".
     """
     try:
-        chain_output = sql_chain.invoke({"query": nl_query})
+        # SQLDatabaseChain has no native async path; keep it off the event loop
+        chain_output = await run_blocking(sql_chain.invoke, {"query": nl_query})
     except Exception as e:
         print(f"[search_database] Error generating SQL: {e}")
         return ("", [])
@@ -179,13 +180,11 @@ def search_database(nl_query: str):
 
     rows = []
     try:
-        with engine.connect() as conn:
-            result_proxy = conn.execute(text(sql_text))
-            rows = result_proxy.fetchall()
+        rows = await fetch_all(sql_text)
 
-            print(f"[search_database] Resultado da query:")
-            for i, row in enumerate(rows):
-                print(f"  Linha {i + 1}: {row}")
+        print(f"[search_database] Resultado da query:")
+        for i, row in enumerate(rows):
+            print(f"  Linha {i + 1}: {row}")
 
     except Exception as e:
         print(f"[search_database] Erro ao executar a query SQL: {e}")
@@ -213,23 +212,27 @@ Retorne APENAS o texto que o pesquisador usará, sem explicações adicionais.
 """
 )
 
-prompt_generator_chain = LLMChain(
+prompt_generator_chain = traced(LLMChain(
     llm=llm,
     prompt=prompt_generator_prompt,
     verbose=False
-)
+), "prompt_generator_chain")
 
 @medir_tempo
-def get_store_tipo(buyer_request: str) -> str:
+async def get_store_tipo(buyer_request: str) -> str:
     """
-    1. Check if 'store_number' is cached for this agent_id.
-    2. If not cached, run prompt_generator_chain + search_database to find the store.
-    3. Cache the store_number, store_id, store_tipo.
-    4. Return the store_number.
+    1. Route the request with the local store index (no LLM involved).
+    2. If the index is not confident, run prompt_generator_chain + search_database to find the store.
+    3. Return the store_tipo (accent-free, as used in 'stores').
     """
-    
-    prompt_for_lojas = prompt_generator_chain.run({"user_request": buyer_request})
-    _, rows_store = search_database(prompt_for_lojas)
+    store_tipo, confidence = store_router.route(buyer_request)
+    if store_tipo and confidence >= ROUTER_MIN_CONFIDENCE:
+        print(f"[get_store_tipo] Roteado localmente: '{buyer_request}' -> {store_tipo} (confiança {confidence:.2f})")
+        return store_tipo
+
+    generated = await prompt_generator_chain.ainvoke({"user_request": buyer_request})
+    prompt_for_lojas = generated["text"]
+    _, rows_store = await search_database(prompt_for_lojas)
 
     if not rows_store:
         raise ValueError(f"Nenhuma loja encontrada para: '{buyer_request}'.")
@@ -249,20 +252,12 @@ def get_store_tipo(buyer_request: str) -> str:
 
     return remove_acentos(store_tipo)
 
-def get_store_coordinates(store_number: int, agent_id: str):
-    if "store_position" in agent_cache[agent_id]:
-        return agent_cache[agent_id]["store_position"]
-
-    query = f"Na tabela 'posicao', retorne x,y,z onde numero = {store_number}."
-    _, rows = search_database(query)
-    if not rows:
-        agent_cache[agent_id]["store_position"] = None
-        return None
-
-    x, y, z = rows[0]
-    coords = (x, y, z)
-    agent_cache[agent_id]["store_position"] = coords
-    return coords
+async def get_store_coordinates(store_number: int):
+    """(x, y, z) da loja no índice espacial compartilhado, ou None se ela não tem posição."""
+    # O mapa é carregado no startup; só tenta de novo se aquela carga falhou
+    if not len(store_map.snapshot()):
+        await store_map.refresh_if_changed()
+    return store_map.snapshot().coordinates(int(store_number))
 
 # Prompt para decompor pedido em campos da loja
 atributo_parser_prompt = PromptTemplate(
@@ -283,153 +278,128 @@ Agora responda com o JSON para o pedido:
 """
 )
 
-atributo_parser_chain = LLMChain(llm=llm, prompt=atributo_parser_prompt)
+atributo_parser_chain = traced(LLMChain(llm=llm, prompt=atributo_parser_prompt), "atributo_parser_chain")
 
-@medir_tempo
-def generate_sql_for_loja(buyer_request: str, store_number: int, store_tipo: str) -> str:
-    store_schema = {
-        "Roupas": ["produto", "tipo", "qtd", "preco", "tamanho", "material", "estampa"],
-        "Jogos": ["produto", "tipo", "qtd", "preco", "console"],
-        "Skate": ["produto", "marca", "tipo", "cor", "qtd", "preco"],
-        "Tênis": ["produto", "marca", "tipo", "cor", "qtd", "preco"],
-        "WcDonalds": ["produto", "tipo", "qtd", "preco"],
-        "Livros": ["produto", "autor", "genero", "preco", "idioma", "qtd"],
-        "Eletronicos": ["produto", "tipo", "marca", "preco", "garantia", "qtd"]
-    }
-
-    columns = store_schema.get(store_tipo, ["produto", "tipo", "qtd", "preco"])
-    col_string = ", ".join(columns)
-    base_query = f"SELECT {col_string} FROM loja_{store_number} WHERE qtd > 0"
-
-    # 🧠 Tentar decompor o pedido nos campos certos usando LLM
-    atributos = atributo_parser_chain.run({
+async def extract_attributes(buyer_request: str, columns: list) -> dict:
+    """
+    Decompõe o pedido do comprador em {coluna: valor} usando o atributo_parser_chain.
+    Retorna {} se a resposta do LLM não for um JSON válido.
+    """
+    parsed = await atributo_parser_chain.ainvoke({
         "pedido": buyer_request,
         "campos": ", ".join(columns)
     })
+    atributos = parsed["text"]
 
     try:
         atributos_dict = json.loads(atributos)
     except Exception as e:
-        print(f"[generate_sql_for_loja] Falha ao converter JSON: {e}\nEntrada: {atributos}")
+        print(f"[extract_attributes] Falha ao converter JSON: {e}\nEntrada: {atributos}")
         atributos_dict = {}
 
-    filter_clauses = []
-    for campo, valor in atributos_dict.items():
-        if campo in columns:
-            filter_clauses.append(f"{campo} ILIKE '%{valor}%'")
-
-    if filter_clauses:
-        filters = " AND ".join(filter_clauses)
-        base_query += f" AND ({filters})"
+    if not isinstance(atributos_dict, dict):
+        return {}
 
-    return base_query
+    return {campo: valor for campo, valor in atributos_dict.items() if campo in columns and valor}
 
 @medir_tempo
-def get_matching_items(buyer_request: str, store_description: str, agent_id: str):
-    if "matching_items" in agent_cache[agent_id]:
-        if store_description in agent_cache[agent_id]["matching_items"]:
-            return agent_cache[agent_id]["matching_items"][store_description]
-    else:
-        agent_cache[agent_id]["matching_items"] = {}
+async def extract_filters(buyer_request: str, store_tipo: str, vocabulary: dict):
+    """
+    Decompõe o pedido em filtros {coluna: valor} para o estoque da loja.
+
+    Ordem: extrator por regras sobre o vocabulário do estoque, memo de pedidos já
+    vistos e, só então, o atributo_parser_chain.
+    """
+    columns = columns_for(store_tipo)
+
+    atributos_dict = extract_by_rules(buyer_request, vocabulary, columns)
+    if atributos_dict is None:
+        memo_key = attribute_memo.key(buyer_request, columns)
+        atributos_dict = attribute_memo.get(memo_key)
+        if atributos_dict is None:
+            # 🧠 Tentar decompor o pedido nos campos certos usando LLM
+            atributos_dict = await extract_attributes(buyer_request, columns)
+            # Uma resposta inválida ou vazia do LLM não é memorizada: tenta de novo no próximo pedido
+            if atributos_dict:
+                await attribute_memo.put(memo_key, atributos_dict)
+
+    return atributos_dict
+
+def rows_to_items(rows, columns):
+    return [{col: row[i] for i, col in enumerate(columns)} for row in rows]
+
+async def load_stock(store_number, columns):
+    rows = await fetch_all(stock_query(store_number, columns))
+    return rows_to_items(rows, columns)
 
+async def load_store_stock(store_number, columns) -> StoreStock:
+    items = await load_stock(store_number, columns)
+    # Índices montados uma vez por carga; numa loja grande leva alguns ms, então fora do event loop
+    return await run_blocking(StoreStock, items)
+
+@medir_tempo
+async def get_matching_items(buyer_request: str, store_description: str):
+    # Sem cópia por agente: o estoque e os índices vêm do cache compartilhado (que o
+    # invalidate alcança) e a extração de atributos repetida sai do memo, sem LLM
     store_tipo = store_description
-    schema = {
-        "Roupas": ["produto", "tipo", "qtd", "preco", "tamanho", "material", "estampa"],
-        "Jogos": ["produto", "tipo", "qtd", "preco", "console"],
-        "Skate": ["produto", "marca", "tipo", "cor", "qtd", "preco"],
-        "Tênis": ["produto", "marca", "tipo", "cor", "qtd", "preco"],
-        "WcDonalds": ["produto", "tipo", "qtd", "preco"]
-    }
-    store_number = stores[store_tipo][0]
-    columns = schema.get(store_tipo, ["produto", "tipo", "qtd", "preco"])
-    col_string = ", ".join(columns)
-
-    # 🔎 1. Buscar tudo que está no estoque da loja
-    full_query = f"SELECT {col_string} FROM loja_{store_number} WHERE qtd > 0"
-    _, all_rows = search_database(full_query)
-    all_items = [{col: row[i] for i, col in enumerate(columns)} for row in all_rows]
-    agent_cache[agent_id]["all_items_in_stock"] = all_items
-
-    # 🔍 2. Tentar busca com filtro usando o pedido original
-    loja_prompt = generate_sql_for_loja(buyer_request, store_number, store_tipo)
-    _, rows = search_database(loja_prompt)
-
-    matches = []
-    for r in rows:
-        item = {col: r[i] for i, col in enumerate(columns)}
-        matches.append(item)
+    store_number = store_directory.snapshot()[store_tipo][0]
+    columns = columns_for(store_tipo)
+
+    # 🔎 1. Buscar tudo que está no estoque da loja (cache compartilhado entre agentes)
+    stock = await stock_cache.get(store_number, lambda: load_store_stock(store_number, columns))
+    index = stock.index
+
+    # 🔍 2. Tentar busca com filtro usando o pedido original (índice de trigramas, sem ida ao banco)
+    filtros = await extract_filters(buyer_request, store_tipo, stock.vocabulary)
+    matches = index.match(filtros)
 
     if matches:
-        agent_cache[agent_id]["matching_items"][store_description] = matches
         return matches
 
     # 💡 3. Fallback inteligente por similaridade textual com o estoque
-    buyer_request_lower = buyer_request.lower()
-    fallback_matches = []
-    for item in all_items:
-        for campo in ["produto", "tipo", "marca"]:
-            if campo in item and buyer_request_lower in str(item[campo]).lower():
-                fallback_matches.append(item)
-                break
+    fallback_matches = index.search(buyer_request, STOCK_INDEX_MIN_SCORE)
 
     if fallback_matches:
-        agent_cache[agent_id]["matching_items"][store_description] = fallback_matches
         return fallback_matches
 
-    # 🪙 4. Fallback final com base no preço
+    # 🪙 4. Fallback final com base no preço (busca binária nos preços ordenados, sem ida ao banco)
     reference_price = 250.0
-    preco_query = f"SELECT preco FROM loja_{store_number} WHERE produto ILIKE '%{buyer_request}%' LIMIT 1"
-    _, fallback_rows = search_database(preco_query)
-    if fallback_rows:
+    reference_items = index.match({"produto": buyer_request})
+    if reference_items:
         try:
-            reference_price = float(fallback_rows[0][0])
-        except:
+            reference_price = float(reference_items[0]["preco"])
+        except (TypeError, ValueError):
             pass
 
     min_price = reference_price * 0.8
     max_price = reference_price * 1.2
 
-    fallback_query = f"""
-        SELECT {col_string}
-        FROM loja_{store_number}
-        WHERE qtd > 0 AND preco BETWEEN {min_price} AND {max_price}
-        ORDER BY preco ASC
-    """.strip()
-
-    _, rows = search_database(fallback_query)
-    for r in rows:
-        item = {col: r[i] for i, col in enumerate(columns)}
-        fallback_matches.append(item)
-
-    agent_cache[agent_id]["matching_items"][store_description] = fallback_matches
+    fallback_matches.extend(stock.prices.band(min_price, max_price))
     return fallback_matches
 
+# Campos extras exibidos ao vendedor, na ordem em que aparecem na descrição do item
+DESCRICAO_CAMPOS = ["tamanho", "material", "estampa", "marca", "cor", "console", "autor", "genero", "idioma", "garantia"]
+
 @medir_tempo
-def multi_table_search(buyer_request: str, agent_id: str, store_description: str) -> str:
+async def multi_table_search(buyer_request: str, agent_id: str, store_description: str) -> str:
     lines = []
+    stores = store_directory.snapshot()
     try:
         store_number = stores[store_description][0]
         store_id = stores[store_description][1]
 
         lines.append(f"Loja encontrada: ID={store_id}, tipo={store_description}, numero={store_number}")
 
-        items = get_matching_items(buyer_request, store_description, agent_id)
+        items = await get_matching_items(buyer_request, store_description)
         if items:
             lines.append("Itens Disponíveis:")
             for item in items:
-                descricao = f" - {item['produto']} ({item['tipo']})"
-                if 'tamanho' in item:
-                    descricao += f", tamanho={item['tamanho']}"
-                if 'material' in item:
-                    descricao += f", material={item['material']}"
-                if 'estampa' in item:
-                    descricao += f", estampa={item['estampa']}"
-                if 'marca' in item:
-                    descricao += f", marca={item['marca']}"
-                if 'cor' in item:
-                    descricao += f", cor={item['cor']}"
-                if 'console' in item:
-                    descricao += f", console={item['console']}"
+                descricao = f" - {item['produto']}"
+                if 'tipo' in item:
+                    descricao += f" ({item['tipo']})"
+                for campo in DESCRICAO_CAMPOS:
+                    if campo in item:
+                        descricao += f", {campo}={item[campo]}"
                 descricao += f", qtd={item['qtd']}, R${item['preco']}"
                 lines.append(descricao)
 
@@ -0,0 +1,63 @@
+from functools import lru_cache
+from sqlalchemy import table, column, select, bindparam, func
+
+# Consultas conhecidas sobre 'lojas', 'loja_{numero}' e 'posicao', montadas com
+# parâmetros vinculados. A estrutura de cada consulta é estável, então o SQLAlchemy
+# reaproveita a compilação e o driver pode preparar o statement no servidor.
+
+lojas = table("lojas", column("id"), column("tipo"), column("numero"))
+posicao = table("posicao", column("numero"), column("x"), column("y"), column("z"))
+
+@lru_cache(maxsize=128)
+def loja_table(store_number: int, columns: tuple):
+    return table(f"loja_{int(store_number)}", *(column(col) for col in columns))
+
+def _loja(store_number, columns):
+    # Sempre o mesmo objeto para a mesma loja/colunas, senão o SELECT ganharia um FROM duplicado
+    return loja_table(int(store_number), tuple(sorted(set(columns) | {"produto", "qtd", "preco"})))
+
+def stores_query():
+    return select(lojas.c.tipo, lojas.c.numero, lojas.c.id)
+
+def stores_checksum_query():
+    """Consulta barata que muda sempre que uma loja é incluída, removida ou alterada."""
+    return select(
+        func.count(),
+        func.max(lojas.c.id),
+        func.sum(lojas.c.numero),
+        func.sum(func.length(lojas.c.tipo)),
+    )
+
+def stock_query(store_number, columns):
+    """Todos os itens com estoque, nas colunas pedidas."""
+    loja = _loja(store_number, columns)
+    return select(*(loja.c[col] for col in columns)).where(loja.c.qtd > 0)
+
+def reference_price_query(store_number, produto: str):
+    loja = _loja(store_number, ("produto", "preco"))
+    return (
+        select(loja.c.preco)
+        .where(loja.c.produto.ilike(bindparam("produto", f"%{produto}%")))
+        .limit(1)
+    )
+
+def price_band_query(store_number, columns, min_price: float, max_price: float):
+    loja = _loja(store_number, columns)
+    return (
+        stock_query(store_number, columns)
+        .where(loja.c.preco.between(bindparam("min_price", min_price), bindparam("max_price", max_price)))
+        .order_by(loja.c.preco.asc())
+    )
+
+def positions_query():
+    return select(posicao.c.numero, posicao.c.x, posicao.c.y, posicao.c.z)
+
+def positions_checksum_query():
+    """Muda sempre que uma posição é incluída, removida ou movida."""
+    return select(
+        func.count(),
+        func.sum(posicao.c.numero),
+        func.sum(posicao.c.x),
+        func.sum(posicao.c.y),
+        func.sum(posicao.c.z),
+    )
@@ -0,0 +1,93 @@
+from collections import defaultdict
+from server.db.engine import fetch_all
+from server.db.schema import text_columns_for
+from server.utils.text import remove_acentos, tokenize
+
+# Palavras que indicam o tipo de loja mesmo quando o item não está no estoque
+TIPO_KEYWORDS = {
+    "Roupas": "roupa camiseta camisa blusa calca bermuda shorts jaqueta casaco vestido saia moletom meia",
+    "Jogos": "jogo game videogame console xbox playstation ps5 nintendo switch",
+    "Skate": "skate shape roda rolamento capacete joelheira longboard",
+    "Tenis": "tenis sapato calcado sneaker chuteira",
+    "WcDonalds": "comida lanche hamburguer burger batata refrigerante fome nuggets",
+    "Livros": "livro romance literatura leitura autor",
+    "Eletronicos": "eletronico celular smartphone notebook monitor fone tablet",
+}
+
+class StoreRouter:
+    """
+    Índice invertido token -> lojas, montado a partir da tabela 'lojas'
+    e do vocabulário de cada loja_{numero}.
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.built_from = None
+
+    def build(self, vocabularies: dict):
+        index = defaultdict(set)
+        for store_tipo, words in vocabularies.items():
+            for word in words:
+                for token in tokenize(word):
+                    index[token].add(store_tipo)
+
+        # Troca atômica: consultas em andamento continuam usando o índice antigo
+        self.index = {token: frozenset(tipos) for token, tipos in index.items()}
+
+    def route(self, desired_item: str):
+        """
+        Retorna (store_tipo, confiança). A confiança é a fração dos tokens do
+        pedido que a loja vencedora cobre, zerada em caso de empate.
+        """
+        tokens = tokenize(desired_item)
+        index = self.index
+        if not tokens or not index:
+            return (None, 0.0)
+
+        scores = defaultdict(float)
+        matched = defaultdict(int)
+        for token in tokens:
+            tipos = index.get(token)
+            if not tipos:
+                continue
+            # Tokens exclusivos de uma loja pesam mais que tokens genéricos
+            for tipo in tipos:
+                scores[tipo] += 1.0 / len(tipos)
+                matched[tipo] += 1
+
+        if not scores:
+            return (None, 0.0)
+
+        ranking = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        best_tipo, best_score = ranking[0]
+        if len(ranking) > 1 and ranking[1][1] == best_score:
+            return (best_tipo, 0.0)
+
+        return (best_tipo, matched[best_tipo] / len(tokens))
+
+store_router = StoreRouter()
+
+async def build_store_router(stores: dict):
+    """
+    (Re)constrói o índice a partir do diretório de lojas. Não faz nada se o
+    diretório não mudou desde a última construção.
+    """
+    snapshot = {tipo: tuple(info) for tipo, info in stores.items()}
+    if snapshot == store_router.built_from:
+        return
+
+    vocabularies = {}
+    for store_tipo, (store_number, _) in snapshot.items():
+        words = [store_tipo, TIPO_KEYWORDS.get(remove_acentos(store_tipo), "")]
+        columns = text_columns_for(store_tipo)
+        try:
+            rows = await fetch_all(f"SELECT {', '.join(columns)} FROM loja_{int(store_number)}")
+            for row in rows:
+                words.extend(str(value) for value in row if value is not None)
+        except Exception as e:
+            print(f"[build_store_router] Erro ao ler loja_{store_number}: {e}")
+        vocabularies[store_tipo] = words
+
+    store_router.build(vocabularies)
+    store_router.built_from = snapshot
+    print(f"[build_store_router] Índice com {len(store_router.index)} termos para {len(vocabularies)} lojas")
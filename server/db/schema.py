@@ -0,0 +1,25 @@
+from server.utils.text import remove_acentos
+
+# Colunas de cada tabela loja_{numero}, por tipo de loja
+STORE_SCHEMA = {
+    "Roupas": ["produto", "tipo", "qtd", "preco", "tamanho", "material", "estampa"],
+    "Jogos": ["produto", "tipo", "qtd", "preco", "console"],
+    "Skate": ["produto", "marca", "tipo", "cor", "qtd", "preco"],
+    "Tênis": ["produto", "marca", "tipo", "cor", "qtd", "preco"],
+    "WcDonalds": ["produto", "tipo", "qtd", "preco"],
+    "Livros": ["produto", "autor", "genero", "preco", "idioma", "qtd"],
+    "Eletronicos": ["produto", "tipo", "marca", "preco", "garantia", "qtd"]
+}
+
+DEFAULT_COLUMNS = ["produto", "tipo", "qtd", "preco"]
+
+NUMERIC_COLUMNS = {"qtd", "preco"}
+
+_SCHEMA_BY_KEY = {remove_acentos(tipo): columns for tipo, columns in STORE_SCHEMA.items()}
+
+def columns_for(store_tipo: str) -> list:
+    """Colunas da loja; aceita o tipo com ou sem acentos (as chaves de 'stores' não têm acento)."""
+    return _SCHEMA_BY_KEY.get(remove_acentos(store_tipo), DEFAULT_COLUMNS)
+
+def text_columns_for(store_tipo: str) -> list:
+    return [col for col in columns_for(store_tipo) if col not in NUMERIC_COLUMNS]
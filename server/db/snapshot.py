@@ -0,0 +1,49 @@
+import asyncio
+from server.db.engine import fetch_all
+
+class PolledSnapshot:
+    """
+    Dado derivado de uma tabela, compartilhado por todas as sessões. Cada carga gera um
+    snapshot novo que substitui o anterior de uma vez, então nenhum agente o vê vazio ou
+    pela metade; o watcher só recarrega quando uma consulta barata de checksum muda.
+
+    Subclasses implementam `checksum_query()` e `build()`.
+    """
+
+    def __init__(self, empty, poll_interval: float):
+        self._snapshot = empty
+        self._checksum = None
+        self.poll_interval = poll_interval
+
+    def snapshot(self):
+        return self._snapshot
+
+    def checksum_query(self):
+        raise NotImplementedError
+
+    async def build(self):
+        raise NotImplementedError
+
+    async def checksum(self):
+        rows = await fetch_all(self.checksum_query())
+        return tuple(rows[0]) if rows else None
+
+    async def load(self):
+        checksum = await self.checksum()
+        self._snapshot = await self.build()
+        self._checksum = checksum
+
+    async def refresh_if_changed(self) -> bool:
+        try:
+            if self._checksum is not None and await self.checksum() == self._checksum:
+                return False
+            await self.load()
+            return True
+        except Exception as e:
+            print(f"[{type(self).__name__}] Erro ao atualizar: {e}")
+            return False
+
+    async def run_watcher(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await self.refresh_if_changed()
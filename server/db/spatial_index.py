@@ -0,0 +1,91 @@
+import itertools
+import math
+
+def auto_cell_size(points) -> float:
+    """Lado de célula com cerca de uma loja por célula, nos eixos em que as lojas variam."""
+    points = list(points)
+    extents = [hi - lo for lo, hi in zip(map(min, zip(*points)), map(max, zip(*points)))] if points else []
+    extents = [e for e in extents if e > 0]
+    if not extents:
+        return 1.0
+    return (math.prod(extents) / len(points)) ** (1 / len(extents))
+
+class SpatialGrid:
+    """
+    Grade uniforme sobre as posições (x, y, z) das lojas: cada célula de lado `cell_size`
+    guarda as lojas dentro dela, então vizinhança e raio só medem a distância das lojas
+    nas células próximas do ponto em vez de todas.
+    """
+
+    def __init__(self, positions: dict, cell_size: float = 0):
+        self.positions = {numero: tuple(map(float, coords)) for numero, coords in positions.items()}
+        self.cell_size = float(cell_size) or auto_cell_size(self.positions.values())
+        self._cells = {}
+        for numero, coords in self.positions.items():
+            self._cells.setdefault(self._cell(coords), []).append(numero)
+        if self._cells:
+            self._low = tuple(map(min, zip(*self._cells)))
+            self._high = tuple(map(max, zip(*self._cells)))
+
+    def __len__(self):
+        return len(self.positions)
+
+    def coordinates(self, numero):
+        return self.positions.get(numero)
+
+    def _cell(self, point) -> tuple:
+        return tuple(math.floor(v / self.cell_size) for v in point)
+
+    def _in_box(self, low: tuple, high: tuple) -> list:
+        low = tuple(map(max, low, self._low))
+        high = tuple(map(min, high, self._high))
+        if any(lo > hi for lo, hi in zip(low, high)):
+            return []
+        if math.prod(hi - lo + 1 for lo, hi in zip(low, high)) > len(self._cells):
+            # Caixa maior que a grade ocupada: mais barato filtrar as células existentes
+            cells = (
+                numbers for cell, numbers in self._cells.items()
+                if all(lo <= c <= hi for lo, c, hi in zip(low, cell, high))
+            )
+        else:
+            ranges = (range(lo, hi + 1) for lo, hi in zip(low, high))
+            cells = (self._cells[cell] for cell in itertools.product(*ranges) if cell in self._cells)
+        return [numero for numbers in cells for numero in numbers]
+
+    def _ranked(self, numbers, point) -> list:
+        ranked = [(math.dist(self.positions[numero], point), numero) for numero in numbers]
+        ranked.sort()
+        return [(numero, distance) for distance, numero in ranked]
+
+    def within(self, point, radius: float) -> list:
+        """[(numero, distância)] das lojas a até `radius` de `point`, da mais próxima à mais distante."""
+        if not self.positions or radius < 0:
+            return []
+        numbers = self._in_box(self._cell(v - radius for v in point), self._cell(v + radius for v in point))
+        return [(numero, d) for numero, d in self._ranked(numbers, point) if d <= radius]
+
+    def nearest(self, point, k: int = 1) -> list:
+        """[(numero, distância)] das `k` lojas mais próximas de `point`."""
+        k = min(k, len(self.positions))
+        if k <= 0:
+            return []
+        center = self._cell(point)
+        reach = max(max(abs(c - lo), abs(hi - c)) for c, lo, hi in zip(center, self._low, self._high))
+        # Um ponto fora da área ocupada começa no primeiro anel que alcança a grade, não no 0
+        first = max(max(lo - c, c - hi, 0) for c, lo, hi in zip(center, self._low, self._high))
+        for ring in itertools.count(first):
+            numbers = self._in_box(tuple(c - ring for c in center), tuple(c + ring for c in center))
+            if len(numbers) < k and ring < reach:
+                continue
+            ranked = self._ranked(numbers, point)
+            # Qualquer loja fora da caixa está mais longe do ponto que a borda mais próxima
+            # da caixa; bordas além da grade ocupada (ex.: y num shopping de um andar) não contam
+            margin = min(
+                min(
+                    v - (c - ring) * self.cell_size if c - ring > lo else math.inf,
+                    (c + ring + 1) * self.cell_size - v if c + ring < hi else math.inf,
+                )
+                for v, c, lo, hi in zip(point, center, self._low, self._high)
+            )
+            if ranked[k - 1][1] <= margin or ring >= reach:
+                return ranked[:k]
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from collections import OrderedDict
+from server.config import STOCK_CACHE_TTL, STOCK_CACHE_MAX_STORES
+
+def _retrieve_exception(task):
+    # Evita "Task exception was never retrieved" quando ninguém mais aguardava a carga
+    if not task.cancelled():
+        task.exception()
+
+class StockCache:
+    """
+    Cache de estoque compartilhado por todos os agentes, chaveado pelo número da loja.
+    Entradas expiram após `ttl` segundos e as menos usadas saem quando passa de `max_entries`.
+    Cargas simultâneas da mesma loja são feitas uma única vez.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._loading = {}
+        # Incrementados pelo invalidate: uma carga iniciada antes não grava seu resultado
+        self._generations = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, store_number, loader):
+        """
+        Retorna o estoque da loja. Em caso de miss, `loader()` é aguardado
+        e o resultado fica disponível para os próximos agentes.
+        """
+        key = int(store_number)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        pending = self._loading.get(key)
+        if pending is None:
+            # A carga roda na sua própria tarefa: se quem a iniciou for cancelado (ex.: prefetch
+            # descartado), ela termina mesmo assim para os outros agentes que aguardam a loja
+            pending = asyncio.ensure_future(self._load(key, loader))
+            pending.add_done_callback(_retrieve_exception)
+            self._loading[key] = pending
+        return await asyncio.shield(pending)
+
+    def _generation(self, key) -> tuple:
+        return (self._epoch, self._generations.get(key, 0))
+
+    async def _load(self, key, loader):
+        generation = self._generation(key)
+        try:
+            stock = await loader()
+        finally:
+            if self._generation(key) == generation:
+                self._loading.pop(key, None)
+
+        if self._generation(key) != generation:
+            # Invalidada durante a carga: quem já aguardava recebe o resultado, mas ele não fica em cache
+            return stock
+
+        self._entries[key] = (time.monotonic() + self.ttl, stock)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return stock
+
+    def peek(self, store_number):
+        """Estoque em cache (mesmo expirado) sem disparar carga, ou None."""
+        entry = self._entries.get(int(store_number))
+        return entry[1] if entry is not None else None
+
+    def invalidate(self, store_number=None):
+        """
+        Descarta uma loja, ou todas se `store_number` for None. Cargas em andamento
+        não entram mais no cache, e o próximo pedido da loja faz uma carga nova.
+        """
+        if store_number is None:
+            self._entries.clear()
+            self._loading.clear()
+            self._epoch += 1
+        else:
+            key = int(store_number)
+            self._entries.pop(key, None)
+            self._loading.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "stores": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+stock_cache = StockCache(ttl=STOCK_CACHE_TTL, max_entries=STOCK_CACHE_MAX_STORES)
@@ -0,0 +1,92 @@
+from collections import Counter
+from server.db.schema import NUMERIC_COLUMNS
+from server.utils.text import normalizar
+
+def fold(texto) -> str:
+    """Texto comparável: minúsculas, sem acentos e com espaços simples."""
+    return " ".join(normalizar(texto).split())
+
+def trigrams(texto: str, padded: bool = True) -> set:
+    """Trigramas de `texto` já normalizado; com `padded`, inclui os de início e fim de palavra."""
+    if padded:
+        texto = f"  {texto} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+class StockIndex:
+    """
+    Índice invertido de trigramas sobre as colunas de texto do estoque de uma loja.
+
+    `match` responde filtros {coluna: valor} com a mesma semântica do ILIKE '%valor%'
+    (mas sem diferenciar acentos), e `search` ordena os itens pela fração dos trigramas
+    do pedido que aparecem em qualquer coluna de texto do item.
+    """
+
+    def __init__(self, items):
+        self.items = tuple(items)
+        self._folded = []
+        self._postings = {}
+        self._all_postings = {}
+
+        for idx, item in enumerate(self.items):
+            folded = {}
+            for campo, valor in item.items():
+                if campo in NUMERIC_COLUMNS or valor is None:
+                    continue
+                folded[campo] = fold(valor)
+                postings = self._postings.setdefault(campo, {})
+                for gram in trigrams(folded[campo]):
+                    postings.setdefault(gram, set()).add(idx)
+                    self._all_postings.setdefault(gram, set()).add(idx)
+            self._folded.append(folded)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _candidates(self, campo: str, valor: str):
+        postings = self._postings.get(campo)
+        if postings is None:
+            return set()
+        grams = trigrams(valor, padded=False)
+        if not grams:
+            # Valor com menos de 3 letras: só a verificação abaixo decide
+            return set(range(len(self.items)))
+        sets = sorted((postings.get(gram, set()) for gram in grams), key=len)
+        candidates = set(sets[0])
+        for other in sets[1:]:
+            candidates &= other
+            if not candidates:
+                break
+        return candidates
+
+    def match(self, filters: dict) -> list:
+        """Itens em que cada coluna de `filters` contém o valor pedido, na ordem do estoque."""
+        result = None
+        for campo, valor in filters.items():
+            valor = fold(valor)
+            candidates = {
+                idx for idx in self._candidates(campo, valor)
+                if valor in self._folded[idx].get(campo, "")
+            }
+            result = candidates if result is None else result & candidates
+            if not result:
+                return []
+        if result is None:
+            return list(self.items)
+        return [self.items[idx] for idx in sorted(result)]
+
+    def search(self, text: str, min_score: float, limit: int = None) -> list:
+        """Itens com pelo menos `min_score` dos trigramas de `text`, do mais para o menos parecido."""
+        grams = trigrams(fold(text))
+        if not grams:
+            return []
+        scores = Counter()
+        for gram in grams:
+            scores.update(self._all_postings.get(gram, ()))
+        ranked = [
+            (count / len(grams), idx) for idx, count in scores.items()
+            if count / len(grams) >= min_score
+        ]
+        ranked.sort(key=lambda pair: (-pair[0], pair[1]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [self.items[idx] for _, idx in ranked]
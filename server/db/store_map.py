@@ -0,0 +1,30 @@
+from server.config import STORE_MAP_CELL_SIZE, STORE_MAP_POLL_INTERVAL
+from server.db.engine import fetch_all
+from server.db.query_builder import positions_query, positions_checksum_query
+from server.db.snapshot import PolledSnapshot
+from server.db.spatial_index import SpatialGrid
+
+async def find_all_positions() -> dict:
+    """
+    Load the whole 'posicao' table.
+    Returns {numero: (x, y, z)}.
+    """
+    rows = await fetch_all(positions_query())
+    return {int(row[0]): (float(row[1]), float(row[2]), float(row[3])) for row in rows}
+
+class StoreMap(PolledSnapshot):
+    """Posições de todas as lojas num SpatialGrid, recarregado quando a tabela 'posicao' muda."""
+
+    def __init__(self, cell_size: float = STORE_MAP_CELL_SIZE):
+        super().__init__(SpatialGrid({}, cell_size), STORE_MAP_POLL_INTERVAL)
+        self.cell_size = cell_size
+
+    def checksum_query(self):
+        return positions_checksum_query()
+
+    async def build(self):
+        positions = await find_all_positions()
+        print(f"store positions: {len(positions)} lojas")
+        return SpatialGrid(positions, self.cell_size)
+
+store_map = StoreMap()
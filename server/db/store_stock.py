@@ -0,0 +1,28 @@
+from server.db.attributes import build_vocabulary
+from server.db.stock_index import StockIndex
+from server.db.price_index import PriceIndex
+
+class StockRow(dict):
+    """Linha do estoque em cache, compartilhada por todos os agentes que a encontram."""
+
+    __slots__ = ()
+    # deep_sizeof conta só a referência: a memória é do StockCache, não de cada sessão
+    shared_cache = True
+
+class StoreStock:
+    """
+    Estoque em cache de uma loja e as estruturas derivadas dele, montadas uma única vez
+    por carga. Tudo vive na mesma entrada do StockCache, então expira e é descartado junto.
+    """
+
+    __slots__ = ("items", "vocabulary", "index", "prices")
+    shared_cache = True
+
+    def __init__(self, items):
+        self.items = tuple(StockRow(item) for item in items)
+        self.vocabulary = build_vocabulary(self.items)
+        self.index = StockIndex(self.items)
+        self.prices = PriceIndex(self.items)
+
+    def __len__(self):
+        return len(self.items)
@@ -0,0 +1,285 @@
+"""
+Controle de admissão das chamadas ao LLM, compartilhado por todos os agentes.
+
+Cada chamada pede uma vaga ao `admission`: há um limite global de chamadas simultâneas
+e um token bucket de requisições por minuto por modelo. Quem espera é atendido por
+prioridade (INTERACTIVE antes de NORMAL antes de BACKGROUND), e um 429 do provedor
+pausa o modelo por um tempo, em vez de todas as sessões insistirem ao mesmo tempo.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any
+from langchain_core.language_models.chat_models import BaseChatModel
+from server.utils.tracing import percentile
+
+INTERACTIVE, NORMAL, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", NORMAL: "normal", BACKGROUND: "background"}
+
+_priority = contextvars.ContextVar("llm_priority", default=NORMAL)
+
+@contextmanager
+def llm_priority(priority: int):
+    """Prioridade das chamadas ao LLM feitas dentro do bloco (e das tarefas criadas nele)."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority() -> int:
+    return _priority.get()
+
+def parse_rate_limits(spec: str) -> dict:
+    """"gpt-4o=500,gpt-4o-mini=2000" -> {"gpt-4o": 500.0, "gpt-4o-mini": 2000.0} (requisições/minuto)."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, rpm = item.rpartition("=")
+        limits[model.strip()] = float(rpm)
+    return limits
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or "RateLimit" in type(error).__name__
+
+class TokenBucket:
+    def __init__(self, rpm: float, burst: float):
+        self.rate = rpm / 60.0
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, now: float) -> bool:
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, now: float) -> float:
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int, rate_limits: dict, default_rpm: float, burst: float, backoff: float, sample_size: int = 2048):
+        self.max_concurrency = max_concurrency
+        self.rate_limits = rate_limits
+        self.default_rpm = default_rpm
+        self.burst = burst
+        self.backoff = backoff
+        self.active = 0
+        self.max_queue_depth = 0
+        self.admitted = defaultdict(int)
+        self.rate_limited = defaultdict(int)
+        self._queue = []
+        self._seq = itertools.count()
+        self._buckets = {}
+        # Pausa após um 429, separada do limite de taxa: quando termina, o modelo volta ao normal
+        self._paused_until = {}
+        self._timer = None
+        self._loop = None
+        self._waits = defaultdict(lambda: deque(maxlen=sample_size))
+
+    def _bucket(self, model: str):
+        if model not in self._buckets:
+            rpm = self.rate_limits.get(model, self.default_rpm)
+            self._buckets[model] = TokenBucket(rpm, self.burst) if rpm > 0 else None
+        return self._buckets[model]
+
+    def _has_slot(self) -> bool:
+        return self.max_concurrency <= 0 or self.active < self.max_concurrency
+
+    def _try_admit(self, model: str, now: float) -> bool:
+        if not self._has_slot() or now < self._paused_until.get(model, 0.0):
+            return False
+        bucket = self._bucket(model)
+        if bucket is not None and not bucket.try_take(now):
+            return False
+        self.active += 1
+        return True
+
+    def bind_loop(self, loop):
+        """Event loop do servidor, usado por blocking_slot nas chamadas feitas em threads."""
+        self._loop = loop
+
+    async def acquire(self, model: str, priority: int):
+        self._loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        if not self._queue and self._try_admit(model, start):
+            self._record(model, priority, 0.0)
+            return
+
+        future = self._loop.create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), model, future))
+        self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Foi admitido no mesmo instante em que foi cancelado: devolve a vaga
+                self.release()
+            raise
+        self._record(model, priority, time.monotonic() - start)
+
+    def release(self):
+        self.active -= 1
+        self._wake()
+
+    def _record(self, model: str, priority: int, waited: float):
+        self.admitted[model] += 1
+        self._waits[priority].append(waited)
+
+    def _wake(self):
+        now = time.monotonic()
+        waiting, retry_in = [], None
+        while self._queue and self._has_slot():
+            entry = heapq.heappop(self._queue)
+            _, _, model, future = entry
+            if future.done():
+                continue
+            if self._try_admit(model, now):
+                future.set_result(None)
+                continue
+            # Modelo sem tokens: outros modelos na fila ainda podem passar
+            waiting.append(entry)
+            wait = self._wait_time(model, now)
+            retry_in = wait if retry_in is None else min(retry_in, wait)
+        for entry in waiting:
+            heapq.heappush(self._queue, entry)
+
+        if retry_in is not None:
+            loop = asyncio.get_running_loop()
+            # Um timer longo (ex.: modelo pausado por 429) não pode atrasar outro modelo que libera antes
+            if self._timer is None or loop.time() + retry_in < self._timer.when():
+                if self._timer is not None:
+                    self._timer.cancel()
+                self._timer = loop.call_later(retry_in, self._on_timer)
+
+    def _wait_time(self, model: str, now: float) -> float:
+        paused = self._paused_until.get(model, 0.0) - now
+        if paused > 0:
+            return paused
+        bucket = self._bucket(model)
+        return bucket.wait_time(now) if bucket is not None else 0.0
+
+    def _on_timer(self):
+        self._timer = None
+        self._wake()
+
+    def rate_limit_hit(self, model: str):
+        """O provedor respondeu 429: pausa o modelo por `backoff` segundos."""
+        self.rate_limited[model] += 1
+        now = time.monotonic()
+        self._paused_until[model] = now + self.backoff
+        bucket = self._bucket(model)
+        if bucket is not None:
+            # Depois da pausa o modelo limitado recomeça do bucket vazio, sem rajada acumulada
+            bucket.tokens = 0.0
+            bucket.updated = now
+
+    @contextmanager
+    def blocking_slot(self, model: str, priority: int):
+        """Versão para chamadas síncronas feitas em threads (ex.: SQLDatabaseChain via run_blocking)."""
+        loop = self._loop
+        try:
+            in_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            in_loop = False
+        if loop is None or in_loop or loop.is_closed():
+            yield
+            return
+        asyncio.run_coroutine_threadsafe(self.acquire(model, priority), loop).result()
+        try:
+            yield
+        finally:
+            loop.call_soon_threadsafe(self.release)
+
+    def metrics(self) -> dict:
+        waits = {}
+        for priority, samples in self._waits.items():
+            values = sorted(samples)
+            waits[PRIORITY_NAMES.get(priority, str(priority))] = {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+                "p90_ms": round(percentile(values, 0.90) * 1000, 3),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+                "max_ms": round((values[-1] if values else 0.0) * 1000, 3),
+            }
+        depth = defaultdict(int)
+        for priority, _, _, future in self._queue:
+            if not future.done():
+                depth[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        return {
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": sum(depth.values()),
+            "queue_depth_by_priority": dict(depth),
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": dict(self.admitted),
+            "rate_limited": dict(self.rate_limited),
+            "wait_time": waits,
+        }
+
+class AdmittedChatModel(BaseChatModel):
+    """
+    Envolve um chat model para que cada chamada passe pelo AdmissionController.
+    Repassa os parâmetros do modelo interno, então o llm_string (e a chave do replay) não muda.
+    """
+
+    inner: BaseChatModel
+    controller: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return self.inner._llm_type
+
+    @property
+    def _identifying_params(self) -> dict:
+        return self.inner._identifying_params
+
+    def _get_invocation_params(self, stop=None, **kwargs) -> dict:
+        return self.inner._get_invocation_params(stop=stop, **kwargs)
+
+    @property
+    def _model(self) -> str:
+        return getattr(self.inner, "model_name", None) or self.inner._llm_type
+
+    def _failed(self, error: Exception):
+        if is_rate_limit_error(error):
+            self.controller.rate_limit_hit(self._model)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        with self.controller.blocking_slot(self._model, current_priority()):
+            try:
+                return self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                self._failed(e)
+                raise
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await self.controller.acquire(self._model, current_priority())
+        try:
+            return await self.inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        except Exception as e:
+            self._failed(e)
+            raise
+        finally:
+            self.controller.release()
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await self.controller.acquire(self._model, current_priority())
+        try:
+            async for chunk in self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                yield chunk
+        except Exception as e:
+            self._failed(e)
+            raise
+        finally:
+            self.controller.release()
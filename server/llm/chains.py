@@ -1,24 +1,17 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableSequence
-from server.llm.prompts import buyer_prompt, seller_prompt, resumo_prompt, prompt_interestChecker, first_interest_prompt
-from server.models.schemas import AgentResponse
-from server.config import OPENAI_API_KEY, OPENAI_MODEL_NAME
+from server.llm.prompts import buyer_prompt, seller_prompt, resumo_prompt, prompt_interestChecker, first_interest_prompt, parser
+from server.llm.providers import create_llm
+from server.utils.tracing import traced
 
 # LLMs
-openai_llm = ChatOpenAI(
-    model_name=OPENAI_MODEL_NAME,
-    openai_api_key=OPENAI_API_KEY,
-    temperature=0.3
-)
-
-# Output parser
-parser = PydanticOutputParser(pydantic_object=AgentResponse)
+chat_llm = create_llm(temperature=0.3)
 
 # Cadeias LLM
-buyer_chain = buyer_prompt | openai_llm | parser
-seller_chain = seller_prompt | openai_llm 
-resumo_chain = resumo_prompt | openai_llm
-first_interest_chain = first_interest_prompt | openai_llm
-interestChecker_chain = prompt_interestChecker | openai_llm
\ No newline at end of file
+buyer_chain = traced(buyer_prompt | chat_llm | parser, "buyer_chain")
+# Mesmo prompt sem o parser, para enviar os tokens ao cliente conforme chegam
+buyer_stream_chain = traced(buyer_prompt | chat_llm, "buyer_chain")
+seller_chain = traced(seller_prompt | chat_llm, "seller_chain")
+resumo_chain = traced(resumo_prompt | chat_llm, "resumo_chain")
+first_interest_chain = traced(first_interest_prompt | chat_llm, "first_interest_chain")
+interestChecker_chain = traced(prompt_interestChecker | chat_llm, "interestChecker_chain")
\ No newline at end of file
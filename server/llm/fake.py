@@ -0,0 +1,128 @@
+"""
+Modelo de chat determinístico, sem rede: a mesma entrada sempre gera a mesma resposta
+e o mesmo tempo de resposta. Usado pelo provedor "fake" (ver providers.py).
+"""
+import asyncio
+import json
+import re
+import time
+import zlib
+from typing import List
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+def default_response(prompt: str) -> str:
+    """Resposta no formato que cada chain do servidor espera, escolhida pelo texto do prompt."""
+    if "expert SQL developer" in prompt:
+        return "SELECT id, tipo, numero FROM lojas WHERE tipo = 'Roupas'"
+    if "mapear pedidos do comprador" in prompt:
+        return "Na tabela 'lojas', retorne id, tipo, numero WHERE tipo = 'Roupas'"
+    if "separa um pedido de compra" in prompt:
+        pedido = re.search(r'Pedido: "([^"]*)"', prompt)
+        palavras = pedido.group(1).split() if pedido else []
+        return json.dumps({"produto": palavras[0]} if palavras else {}, ensure_ascii=False)
+    if "Responda com \"yes\" ou \"no\"" in prompt:
+        return "yes" if zlib.crc32(prompt.encode()) % 2 else "no"
+    if "final_offer" in prompt:
+        return json.dumps({"answer": "Obrigado, vou pensar na oferta.", "final_offer": True}, ensure_ascii=False)
+    if "resumir ofertas" in prompt:
+        return "Produto: Camiseta\nDescrição: Branca, algodão\nPreço: R$ 49,90"
+    if "Você é o Seller" in prompt:
+        return "Temos camiseta branca de algodão, tamanho M, por R$ 49,90. Posso separar para você?"
+    return "Olá! Vocês têm algo do que estou procurando?"
+
+def load_script(path: str) -> list:
+    """
+    Respostas roteirizadas de um arquivo JSON (lista) ou JSONL, uma por entrada:
+    {"match": "<regex aplicada ao prompt>", "response": "<texto>"}. Vale a primeira que casar.
+    """
+    if not path:
+        return []
+    with open(path, encoding="utf-8") as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        entries = json.loads(content)
+    else:
+        entries = [json.loads(line) for line in content.splitlines() if line.strip()]
+    return [(re.compile(entry["match"], re.S), entry["response"]) for entry in entries]
+
+def split_tokens(text: str) -> list:
+    return re.findall(r"\S+\s*", text)
+
+class FakeChatModel(BaseChatModel):
+    """
+    Responde com o roteiro (`script`) ou com `default_response`, esperando `latency`
+    segundos (± `jitter`, fixo por prompt) e mais um token a cada 1/`token_rate` segundos.
+    Informa usage_metadata como um provedor real, contando tokens por palavras.
+    """
+
+    model_name: str = "fake"
+    temperature: float = 0.0
+    latency: float = 0.0
+    token_rate: float = 0.0
+    jitter: float = 0.0
+    script: List = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model_name": self.model_name, "temperature": self.temperature}
+
+    @staticmethod
+    def _prompt(messages) -> str:
+        return "\n".join(str(m.content) for m in messages)
+
+    def _respond(self, prompt: str) -> str:
+        for pattern, response in self.script:
+            if pattern.search(prompt):
+                return response
+        return default_response(prompt)
+
+    def _first_token_delay(self, prompt: str) -> float:
+        if not self.jitter:
+            return self.latency
+        # Variação reproduzível: depende só do prompt
+        spread = (zlib.crc32(prompt.encode()) % 2001 - 1000) / 1000
+        return max(0.0, self.latency * (1 + self.jitter * spread))
+
+    def _token_delay(self) -> float:
+        return 1 / self.token_rate if self.token_rate > 0 else 0.0
+
+    def _message(self, prompt: str, text: str) -> AIMessage:
+        input_tokens, output_tokens = len(split_tokens(prompt)), len(split_tokens(text))
+        return AIMessage(content=text, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        })
+
+    def _duration(self, prompt: str, text: str) -> float:
+        return self._first_token_delay(prompt) + max(len(split_tokens(text)) - 1, 0) * self._token_delay()
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = self._prompt(messages)
+        text = self._respond(prompt)
+        time.sleep(self._duration(prompt, text))
+        return ChatResult(generations=[ChatGeneration(message=self._message(prompt, text))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = self._prompt(messages)
+        text = self._respond(prompt)
+        await asyncio.sleep(self._duration(prompt, text))
+        return ChatResult(generations=[ChatGeneration(message=self._message(prompt, text))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = self._prompt(messages)
+        text = self._respond(prompt)
+        await asyncio.sleep(self._first_token_delay(prompt))
+        for i, token in enumerate(split_tokens(text)):
+            if i:
+                await asyncio.sleep(self._token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
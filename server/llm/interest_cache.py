@@ -0,0 +1,106 @@
+import asyncio
+from collections import OrderedDict
+from server.config import INTEREST_CACHE_SIZE, INTEREST_FUZZY_THRESHOLD
+from server.llm.chains import interestChecker_chain
+from server.utils.text import normalizar, tokenize
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+def interest_tokens(interests) -> frozenset:
+    if isinstance(interests, (list, tuple, set)):
+        interests = " ".join(str(i) for i in interests)
+    return frozenset(tokenize(interests or ""))
+
+class InterestCache:
+    """
+    Decisões yes/no do interestChecker_chain por (descrição da loja, interesses).
+    As chaves são normalizadas (acentos, caixa, ordem dos interesses); sem acerto exato,
+    aceita uma entrada cujos conjuntos de tokens tenham similaridade >= `threshold`.
+    """
+
+    def __init__(self, max_entries: int, threshold: float):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(store_description, interests) -> tuple:
+        return (frozenset(tokenize(store_description or "")), interest_tokens(interests))
+
+    def get(self, store_description, interests):
+        key = self.key(store_description, interests)
+        answer = self._entries.get(key)
+        if answer is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return answer
+
+        best, best_score = None, 0.0
+        if self.threshold < 1.0:
+            store_tokens, tokens = key
+            for (other_store, other_interests), other_answer in self._entries.items():
+                store_score = jaccard(store_tokens, other_store)
+                if store_score < self.threshold:
+                    continue
+                score = min(store_score, jaccard(tokens, other_interests))
+                if score >= self.threshold and score > best_score:
+                    best, best_score = other_answer, score
+
+        if best is not None:
+            self.fuzzy_hits += 1
+            return best
+
+        self.misses += 1
+        return None
+
+    def put(self, store_description, interests, answer: str):
+        key = self.key(store_description, interests)
+        self._entries[key] = answer
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+        }
+
+interest_cache = InterestCache(max_entries=INTEREST_CACHE_SIZE, threshold=INTEREST_FUZZY_THRESHOLD)
+
+async def check_interest(store_description: str, interests) -> str:
+    """Resposta do interestChecker_chain ("yes"/"no"), consultando o cache antes do LLM."""
+    answer = interest_cache.get(store_description, interests)
+    if answer is not None:
+        return answer
+
+    result = await interestChecker_chain.ainvoke({
+        "storeDescription": store_description,
+        "buyerInterest": interests
+    })
+    answer = normalizar(result.content)
+    interest_cache.put(store_description, interests, answer)
+    return answer
+
+async def precompute_interests(interests, store_descriptions) -> dict:
+    """Avalia todas as lojas para um perfil de interesses de uma vez, aquecendo o cache."""
+    store_descriptions = list(store_descriptions)
+    answers = await asyncio.gather(
+        *(check_interest(store, interests) for store in store_descriptions),
+        return_exceptions=True,
+    )
+    result = {}
+    for store, answer in zip(store_descriptions, answers):
+        if isinstance(answer, Exception):
+            print(f"[precompute_interests] Falha ao avaliar '{store}': {answer}")
+            continue
+        result[store] = answer
+    return result
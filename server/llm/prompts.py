@@ -1,48 +1,46 @@
 from langchain.prompts import PromptTemplate, ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.messages import SystemMessage
 from server.models.schemas import AgentResponse
 
 parser = PydanticOutputParser(pydantic_object=AgentResponse)
+# Calculado uma vez: o schema do AgentResponse não muda durante a execução
+FORMAT_INSTRUCTIONS = parser.get_format_instructions()
 
-buyer_prompt = ChatPromptTemplate.from_messages([
-    SystemMessagePromptTemplate.from_template("""
+# Os prompts de conversa começam por uma mensagem de sistema fixa, igual para todas as
+# sessões, e deixam os dados da sessão e do turno (item, orçamento, histórico, estoque,
+# última fala) para a última mensagem. Assim o prefixo enviado ao provedor não muda
+# entre chamadas e pode ser reaproveitado pelo cache de prompt dele.
+
+BUYER_INSTRUCTIONS = SystemMessage(content="""
     Você é o Buyer (comprador) em uma loja no shopping.
     Não se identifique como IA.
 
     Objetivo:
-    - Você está buscando o: {desired_item}.
-    - Seu orçamento máximo é de R$ {max_price}.
-    - Além do produto desejado, também possui interesse em: {buyer_interests}.
+    - Você está buscando o produto desejado informado ao final.
+    - Não gaste mais que o seu orçamento máximo, também informado ao final.
+    - Além do produto desejado, também possui os interesses informados ao final.
     - Suas respostas podem considerar e fazer referência a esses interesses.
     - Produtos semelhantes aos interesses definidos podem ser considerados também como desejados.
     - Você deve tentar comprar o produto desejado ou algo de seu interesse gastando o mínimo possível.
     - Caso não possua o produto desejado ou esteja fora do orçamento, pode flexibilizar o pedido para algo similar, principalmente se estiver alinhado a seus interesses.
     - Evite fazer muitas perguntas a respeito, apenas tente chegar em um produto satisfatório considerando seu objetivo e interesses.
 
-    Histórico da conversa até agora:
-    {history}
-
-    """),
+    Responda como BUYER à última fala do Vendedor (Seller) seguindo estas instruções:
 
-    HumanMessagePromptTemplate.from_template("""
-    A última fala do Vendedor (Seller) foi:
-    {seller_utterance}
-
-    Agora responda como BUYER seguindo estas instruções:
-                                             
     Responda em JSON utilizando o seguinte formato:
-    {format_instructions}
+    """ + FORMAT_INSTRUCTIONS + """
     answer -> string : se refere a resposta efetiva do comprador no diálogo.
-    final_offer -> boolean : identifica se {seller_utterance} foi uma oferta válida do vendedor.
+    final_offer -> boolean : identifica se a última fala do vendedor foi uma oferta válida.
 
-    1. Caso o vendedor tenha oferecido algum produto semelhante ao seu objetivo ou dentro de seus interesses, por um preço abaixo de R$ {max_price}:
+    1. Caso o vendedor tenha oferecido algum produto semelhante ao seu objetivo ou dentro de seus interesses, por um preço abaixo do seu orçamento máximo:
         answer: Agradeça ao vendedor e diga que vai pensar na oferta.
         final_offer: true
-                                             
-    2. Caso o vendedor tenha oferecido algum produto semelhante ao seu objetivo ou dentro de seus interesses, por um preço MAIOR que R$ {max_price}:
+
+    2. Caso o vendedor tenha oferecido algum produto semelhante ao seu objetivo ou dentro de seus interesses, por um preço MAIOR que o seu orçamento máximo:
         answer: Exponha seu orçamento e pergunte se o vendedor pode fazer uma oferta melhor.
         final_offer: false
-                                             
+
     3. Se o produto oferecido pelo vendedor for muito diferente das suas especificações e interesses:
         answer: Pergunte se o vendedor tem algo mais alinhado ao seu pedido.
         final_offer: false
@@ -50,72 +48,92 @@ buyer_prompt = ChatPromptTemplate.from_messages([
     Observação:
     - NÃO invente preços. Baseie-se somente no que o vendedor falou.
     - NÃO se identifique como IA em nenhum momento.
-                                             
+
     Exemplo de Execução:
     Seu produto desejado é um tenis nike, mas você possui como interesse "estar com fome"
     Caso esteja em uma loja e identifique que o vendedor tenha comida, você deve entender esse como o produto desejado.
     """)
+
+buyer_prompt = ChatPromptTemplate.from_messages([
+    BUYER_INSTRUCTIONS,
+
+    HumanMessagePromptTemplate.from_template("""
+    Produto desejado: {desired_item}
+    Orçamento máximo: R$ {max_price}
+    Interesses: {buyer_interests}
+
+    Histórico da conversa até agora:
+    {history}
+
+    A última fala do Vendedor (Seller) foi:
+    {seller_utterance}
+    """)
 ])
 
-first_interest_prompt = ChatPromptTemplate.from_messages([
-    SystemMessagePromptTemplate.from_template("""
+FIRST_INTEREST_INSTRUCTIONS = SystemMessage(content="""
     Você é o Buyer (comprador) em uma loja no shopping.
     Não se identifique como IA.
 
     Objetivo:
-    - Você está buscando especificamente: {desired_item}.
-    - Além do produto desejado, também possui interesse em: {buyer_interests}.
-    - Seu orçamento máximo é de R$ {max_price}.
+    - Você está buscando especificamente o produto desejado informado ao final.
+    - Além do produto desejado, também possui os interesses informados ao final.
+    - Não gaste mais que o seu orçamento máximo, também informado ao final.
     - Você deve tentar comprar o produto desejado gastando o mínimo possível.
     - Caso não possua o produto desejado ou esteja fora do orçamento, pode flexibilizar o pedido para algo similar.
     - Você pode fazer NO MÁXIMO 3 perguntas sobre preço, quantidade, material, tamanho ou estampa para tentar atingir seu objetivo.
 
-    Histórico da conversa até agora:
-    {history}
-
-    """),
-
-    HumanMessagePromptTemplate.from_template("""
-    Você é o comprador em um shopping e identificou um vendedor que aparenta ter produtos que atendam a um dos seus seguintes interesses:
-    {buyer_interests}
-                                             
+    Você identificou um vendedor que aparenta ter produtos que atendam a um dos seus interesses.
     Inicie uma conversa com o vendedor, perguntando sobre esse interesse e tentando descobrir mais informações sobre o produto.
 
     Observação:
     - NÃO invente preços. Baseie-se somente no que o vendedor falou.
     - NÃO se identifique como IA em nenhum momento.
     """)
+
+first_interest_prompt = ChatPromptTemplate.from_messages([
+    FIRST_INTEREST_INSTRUCTIONS,
+
+    HumanMessagePromptTemplate.from_template("""
+    Produto desejado: {desired_item}
+    Orçamento máximo: R$ {max_price}
+    Interesses: {buyer_interests}
+
+    Histórico da conversa até agora:
+    {history}
+    """)
 ])
 
-seller_prompt = ChatPromptTemplate.from_messages([
-    SystemMessagePromptTemplate.from_template("""
+SELLER_INSTRUCTIONS = SystemMessage(content="""
     Você é o Seller (vendedor) em uma loja no shopping.
     Não se identifique como IA.
 
     Objetivo:
-    - Vender produtos (ou responder perguntas) usando dados reais do estoque.
+    - Vender produtos (ou responder perguntas) usando dados reais do estoque informado ao final.
     - Responda perguntas do Buyer sobre produto, preço, quantidade, material, tamanho ou estampa.
     - Não invente informações, utilize apenas dados reais do estoque.
     - Não encerre a conversa você mesmo.
     - Não sugira outros produtos.
 
+    Responda como SELLER à última fala do Comprador (Buyer):
+    1. Se possível, use as informações de 'Estoque' para dar detalhes reais.
+    2. Não se identifique como IA.
+    3. Sempre faça uma oferta para o comprador a partir do estoque.
+    4. Se não houver estoque, informe que não há estoque e faça uma oferta alternativa que aparente atender o melhor possível ao pedido do cliente.
+    5. SEMPRE ofereça apenas UM produto ao cliente por vez, escolhendo aquele que melhor atende ao pedido do cliente.
+    """)
+
+seller_prompt = ChatPromptTemplate.from_messages([
+    SELLER_INSTRUCTIONS,
+
+    HumanMessagePromptTemplate.from_template("""
     Estoque disponível (buscado com multi-table logic):
     {stock_info}
 
     Histórico da conversa até agora:
     {history}
 
-    """),
-    HumanMessagePromptTemplate.from_template("""
     A última fala do Comprador (Buyer) foi:
     {buyer_utterance}
-
-    Agora responda como SELLER:
-    1. Se possível, use as informações de 'Estoque' acima para dar detalhes reais.
-    2. Não se identifique como IA.
-    3. Sempre faça uma oferta para o comprador a partir do estoque.
-    4. Se não houver estoque, informe que não há estoque e faça uma oferta alternativa que aparente atender o melhor possível ao pedido do cliente.
-    5. SEMPRE ofereça apenas UM produto ao cliente por vez, escolhendo aquele que melhor atende ao pedido do cliente.
     """)
 ])
 
@@ -162,10 +180,11 @@ prompt_interestChecker = PromptTemplate(
     input_variables=["storeDescription", "buyerInterest"],
     template="""
 Você esta guiando um cliente dentro de um shopping e deve definir seu comportamento de acordo com os interesses do cliente.
-Considerando como os interesses do cliente: {buyerInterest}
-Ao avistar uma loja de {storeDescription}, o cliente apresenta interesse?
 Responda com "yes" ou "no".
 Não utilize aspas, apenas os 2 ou 3 caracteres.
 Nenhuma outra resposta será aceita.
+
+Considerando como os interesses do cliente: {buyerInterest}
+Ao avistar uma loja de {storeDescription}, o cliente apresenta interesse?
 """
 )
@@ -0,0 +1,83 @@
+"""
+Registro de provedores de LLM. As chains e o SQLDatabaseChain pedem o modelo a
+`create_llm`, que usa o provedor escolhido em LLM_PROVIDER (server/config.py).
+"""
+from langchain_openai import ChatOpenAI
+from server.llm.fake import FakeChatModel, load_script
+from server.llm.replay import create_replay_cache
+from server.llm.admission import AdmissionController, AdmittedChatModel, parse_rate_limits
+from server.config import (
+    LLM_PROVIDER,
+    OPENAI_API_KEY,
+    OPENAI_MODEL_NAME,
+    OPENROUTER_API_KEY,
+    OPENROUTER_BASE_URL,
+    FAKE_LLM_LATENCY,
+    FAKE_LLM_TOKEN_RATE,
+    FAKE_LLM_JITTER,
+    FAKE_LLM_SCRIPT,
+    LLM_REPLAY_MODE,
+    LLM_REPLAY_PATH,
+    LLM_MAX_CONCURRENCY,
+    LLM_RATE_LIMITS,
+    LLM_DEFAULT_RPM,
+    LLM_RATE_BURST,
+    LLM_RATE_LIMIT_BACKOFF,
+)
+
+PROVIDERS = {}
+
+replay_cache = create_replay_cache(LLM_REPLAY_MODE, LLM_REPLAY_PATH)
+
+admission = AdmissionController(
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    rate_limits=parse_rate_limits(LLM_RATE_LIMITS),
+    default_rpm=LLM_DEFAULT_RPM,
+    burst=LLM_RATE_BURST,
+    backoff=LLM_RATE_LIMIT_BACKOFF,
+)
+
+def register_provider(name: str):
+    """Registra `factory(model_name, temperature) -> BaseChatModel` sob `name`."""
+    def decorator(factory):
+        PROVIDERS[name] = factory
+        return factory
+    return decorator
+
+@register_provider("openai")
+def openai_provider(model_name: str, temperature: float):
+    return ChatOpenAI(model_name=model_name, openai_api_key=OPENAI_API_KEY, temperature=temperature)
+
+@register_provider("openrouter")
+def openrouter_provider(model_name: str, temperature: float):
+    return ChatOpenAI(model_name=model_name, api_key=OPENROUTER_API_KEY, base_url=OPENROUTER_BASE_URL, temperature=temperature)
+
+_fake_script = None
+
+@register_provider("fake")
+def fake_provider(model_name: str, temperature: float):
+    global _fake_script
+    if _fake_script is None:
+        _fake_script = load_script(FAKE_LLM_SCRIPT)
+    return FakeChatModel(
+        model_name=model_name,
+        temperature=temperature,
+        latency=FAKE_LLM_LATENCY,
+        token_rate=FAKE_LLM_TOKEN_RATE,
+        jitter=FAKE_LLM_JITTER,
+        script=_fake_script,
+    )
+
+def create_llm(temperature: float, model_name: str = OPENAI_MODEL_NAME, provider: str = LLM_PROVIDER):
+    try:
+        factory = PROVIDERS[provider]
+    except KeyError:
+        raise ValueError(f"Provedor de LLM desconhecido: '{provider}'. Disponíveis: {', '.join(sorted(PROVIDERS))}")
+    # Respostas reproduzidas do cache não ocupam vaga no controle de admissão
+    llm = AdmittedChatModel(inner=factory(model_name, temperature), controller=admission)
+    if replay_cache is not None:
+        llm.cache = replay_cache
+        # O cache do LangChain não vale para streaming; com gravação/reprodução ativa
+        # o stream vira uma única resposta, para que toda chamada seja gravada ou reproduzida
+        llm.disable_streaming = True
+    return llm
@@ -0,0 +1,103 @@
+"""
+Gravação e reprodução de chamadas ao LLM. A chave é o conteúdo: provedor, modelo,
+temperatura (o llm_string do LangChain) e o prompt já renderizado.
+
+Modos (LLM_REPLAY_MODE):
+ - "passthrough": desligado, toda chamada vai ao provedor;
+ - "record": toda chamada vai ao provedor e a resposta é gravada (sobrescreve);
+ - "replay": respostas gravadas são reaproveitadas; prompts novos vão ao provedor e são gravados.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from server.utils.executor import run_blocking
+
+REPLAY_MODES = ("passthrough", "record", "replay")
+
+class ReplayCache(BaseCache):
+    """Respostas gravadas em um arquivo SQLite em modo WAL, compartilhável entre workers."""
+
+    def __init__(self, path: str, mode: str):
+        if mode not in REPLAY_MODES:
+            raise ValueError(f"LLM_REPLAY_MODE desconhecido: {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_calls ("
+            "key TEXT PRIMARY KEY, llm_string TEXT NOT NULL, prompt TEXT NOT NULL, "
+            "generations TEXT NOT NULL, recorded_at REAL NOT NULL)"
+        )
+
+    @staticmethod
+    def key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode()).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        if self.mode != "replay":
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT generations FROM llm_calls WHERE key = ?", (self.key(prompt, llm_string),)
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [loads(generation) for generation in json.loads(row[0])]
+
+    def update(self, prompt, llm_string, return_val):
+        if self.mode == "passthrough":
+            return
+        generations = json.dumps([dumps(generation) for generation in return_val], ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO llm_calls (key, llm_string, prompt, generations, recorded_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET generations = excluded.generations, recorded_at = excluded.recorded_at",
+                (self.key(prompt, llm_string), llm_string, prompt, generations, time.time()),
+            )
+        self.recorded += 1
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_calls")
+
+    async def alookup(self, prompt, llm_string):
+        if self.mode != "replay":
+            return None
+        return await run_blocking(self.lookup, prompt, llm_string)
+
+    async def aupdate(self, prompt, llm_string, return_val):
+        if self.mode == "passthrough":
+            return
+        await run_blocking(self.update, prompt, llm_string, return_val)
+
+    async def aclear(self, **kwargs):
+        await run_blocking(self.clear)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_calls").fetchone()[0]
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "recorded": self.recorded,
+        }
+
+def create_replay_cache(mode: str, path: str):
+    """Cache de gravação/reprodução para LLM_REPLAY_MODE, ou None em "passthrough"."""
+    if mode == "passthrough":
+        return None
+    return ReplayCache(path, mode)
@@ -0,0 +1,37 @@
+import json
+from langchain_core.utils.json import parse_json_markdown, parse_partial_json
+
+def partial_answer(text: str) -> str:
+    """
+    Extrai o campo 'answer' de um JSON ainda incompleto (saída do buyer_chain em streaming).
+    """
+    try:
+        parsed = parse_json_markdown(text, parser=parse_partial_json)
+    except Exception:
+        return ""
+    if not isinstance(parsed, dict):
+        return ""
+    answer = parsed.get("answer")
+    return answer if isinstance(answer, str) else ""
+
+async def stream_answer(chain, inputs: dict, websocket, request_id, extract=None):
+    """
+    Executa `chain` em streaming e envia cada trecho novo da resposta como um frame
+    {"request_id", "delta", "done": false}. `extract` converte o texto acumulado no
+    texto visível ao usuário (ex.: partial_answer para respostas em JSON).
+    Retorna a mensagem completa (AIMessageChunk).
+    """
+    message = None
+    sent = ""
+    async for chunk in chain.astream(inputs):
+        message = chunk if message is None else message + chunk
+        visible = extract(message.content) if extract else message.content
+        if len(visible) > len(sent) and visible.startswith(sent):
+            await websocket.send_text(json.dumps({
+                "request_id": request_id,
+                "delta": visible[len(sent):],
+                "done": False,
+            }))
+            sent = visible
+
+    return message
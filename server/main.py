@@ -1,10 +1,36 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from server.websocket_handler import websocket_endpoint
+from server.db.engine import async_engine
+from server.db.stock_cache import stock_cache
+from server.utils.memory import sessions
+from server.db.directory import store_directory
+from server.db.store_map import store_map
+from server.utils.tracing import tracer
+from server.llm.interest_cache import interest_cache
+from server.llm.providers import replay_cache, admission
 import uvicorn
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Chamadas síncronas ao LLM (em threads) passam pela admissão desde a primeira
+    admission.bind_loop(asyncio.get_running_loop())
+    await store_directory.refresh_if_changed()
+    await store_map.refresh_if_changed()
+    background = [
+        asyncio.create_task(sessions.run_evictor()),
+        asyncio.create_task(store_directory.run_watcher()),
+        asyncio.create_task(store_map.run_watcher()),
+    ]
+    yield
+    for task in background:
+        task.cancel()
+    await async_engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
 app.websocket("/ws/{agent_id}")(websocket_endpoint)
@@ -13,5 +39,42 @@ app.websocket("/ws/{agent_id}")(websocket_endpoint)
 async def root():
     return HTMLResponse("<h1>Servidor WebSocket rodando!</h1>")
 
+@app.get("/metrics")
+async def metrics():
+    # Latência (p50/p90/p99) por ação websocket, chain e SQL, com tokens das chains
+    return tracer.summary()
+
+@app.get("/metrics/traces/{request_id}")
+async def request_trace(request_id: str):
+    return tracer.trace(request_id)
+
+@app.get("/metrics/llm")
+async def llm_admission_metrics():
+    # Fila do controle de admissão: vagas em uso, profundidade e espera por prioridade
+    return admission.metrics()
+
+@app.get("/metrics/sessions")
+async def session_metrics():
+    return sessions.metrics()
+
+@app.get("/cache/stock")
+async def stock_cache_stats():
+    return stock_cache.stats()
+
+@app.get("/cache/interest")
+async def interest_cache_stats():
+    return interest_cache.stats()
+
+@app.get("/cache/llm")
+async def llm_replay_stats():
+    if replay_cache is None:
+        return {"mode": "passthrough"}
+    return replay_cache.stats()
+
+@app.post("/cache/stock/invalidate")
+async def invalidate_stock_cache(store_number: int | None = None):
+    stock_cache.invalidate(store_number)
+    return stock_cache.stats()
+
 if __name__ == "__main__":
-    uvicorn.run("server.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("server.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,84 @@
+from server.config import HISTORY_MAX_TURNS, HISTORY_KEEP_TURNS, HISTORY_SUMMARIZE
+
+class Conversation:
+    """
+    Histórico de uma sessão. O texto enviado aos prompts é mantido já renderizado
+    e só cresce pela fala nova, em vez de ser remontado a cada mensagem.
+    """
+
+    __slots__ = ("turns", "summary", "_rendered", "_generation", "_compacting")
+
+    def __init__(self):
+        self.turns = []
+        self.summary = ""
+        self._rendered = ""
+        self._generation = 0
+        self._compacting = False
+
+    def append(self, role: str, text: str):
+        self.turns.append({"role": role, "text": text})
+        line = f"{role.upper()}: {text}"
+        self._rendered = f"{self._rendered}\n{line}" if self._rendered else line
+
+    def render(self) -> str:
+        if self.summary:
+            return f"RESUMO DA CONVERSA ANTERIOR: {self.summary}\n{self._rendered}"
+        return self._rendered
+
+    def clear(self):
+        self.turns = []
+        self.summary = ""
+        self._rendered = ""
+        self._generation += 1
+
+    def __len__(self):
+        return len(self.turns)
+
+    def __iter__(self):
+        return iter(self.turns)
+
+    def to_state(self) -> dict:
+        return {"turns": list(self.turns), "summary": self.summary}
+
+    def load_state(self, state: dict):
+        self.clear()
+        self.summary = state.get("summary", "")
+        for m in state.get("turns", []):
+            self.append(m["role"], m["text"])
+
+    def needs_compaction(self) -> bool:
+        return HISTORY_MAX_TURNS > 0 and len(self.turns) > HISTORY_MAX_TURNS and not self._compacting
+
+    async def compact(self, summarize=None):
+        """
+        Tira do histórico literal tudo exceto as últimas HISTORY_KEEP_TURNS falas.
+        Com `summarize` (async texto -> texto) e HISTORY_SUMMARIZE, as falas removidas
+        são incorporadas ao resumo; sem isso, são apenas descartadas.
+        """
+        if not self.needs_compaction():
+            return
+
+        cut = len(self.turns) - HISTORY_KEEP_TURNS
+        older = self.turns[:cut]
+        generation = self._generation
+        self._compacting = True
+        try:
+            summary = self.summary
+            if summarize is not None and HISTORY_SUMMARIZE:
+                text = "\n".join(f"{m['role'].upper()}: {m['text']}" for m in older)
+                if summary:
+                    text = f"{summary}\n{text}"
+                summary = await summarize(text)
+        except Exception as e:
+            print(f"[Conversation.compact] Falha ao resumir histórico: {e}")
+            return
+        finally:
+            self._compacting = False
+
+        # A sessão foi reiniciada enquanto o resumo era gerado
+        if generation != self._generation:
+            return
+
+        self.summary = summary
+        self.turns = self.turns[cut:]
+        self._rendered = "\n".join(f"{m['role'].upper()}: {m['text']}" for m in self.turns)
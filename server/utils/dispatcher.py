@@ -0,0 +1,99 @@
+import asyncio
+import itertools
+from server.utils.executor import spawn
+
+class SessionDispatcher:
+    """
+    Executa as mensagens de uma websocket como tarefas concorrentes.
+
+    Ações fora de `concurrent` alteram a conversa ou o estado da sessão e rodam uma de
+    cada vez, na ordem de chegada. As de `concurrent` começam assim que chegam; só esperam
+    as ações de `barriers` recebidas antes delas (ex.: as que definem as preferências que leem).
+    `superseding` mapeia ação -> função que extrai o alvo da mensagem: uma nova mensagem
+    cancela as pendentes da mesma ação com o mesmo alvo. {"action": "cancel", "request_id": ...}
+    cancela uma requisição; em ambos os casos o cliente recebe {"request_id": ..., "cancelled": true}.
+    """
+
+    def __init__(self, handler, send, concurrent, superseding=None, barriers=()):
+        self.handler = handler
+        self.send = send
+        self.concurrent = set(concurrent)
+        self.superseding = dict(superseding or {})
+        self.barriers = set(barriers)
+        self._tasks = {}
+        self._tail = None
+        self._barrier = None
+        self._closed = False
+        self._anonymous = itertools.count()
+
+    async def submit(self, data_json: dict):
+        action = data_json.get("action")
+        request_id = data_json.get("request_id")
+
+        if action == "cancel":
+            target = data_json.get("target_request_id", request_id)
+            if not self.cancel(target):
+                await self._notify({"request_id": target, "cancelled": False})
+            return
+
+        target = None
+        if action in self.superseding:
+            target = self.superseding[action](data_json)
+            for key, (other_action, other_target, _) in list(self._tasks.items()):
+                if other_action == action and other_target == target:
+                    self.cancel(key)
+
+        # Ações sem request_id (start, nextProduct...) não podem ser canceladas pelo cliente
+        key = request_id if request_id is not None and request_id not in self._tasks else f"_{next(self._anonymous)}"
+        previous = self._barrier if action in self.concurrent else self._tail
+        task = asyncio.create_task(self._run(request_id, previous, data_json))
+        # Limpeza e aviso de cancelamento no callback: uma tarefa cancelada antes de começar
+        # nunca executa o corpo de _run
+        task.add_done_callback(lambda done: self._finished(key, request_id, done))
+        self._tasks[key] = (action, target, task)
+        if action not in self.concurrent:
+            self._tail = task
+        if action in self.barriers:
+            self._barrier = task
+
+    async def _run(self, request_id, previous, data_json: dict):
+        try:
+            if previous is not None:
+                # asyncio.wait não propaga erro nem cancelamento da ação anterior
+                await asyncio.wait([previous])
+            await self.handler(data_json)
+        except Exception as e:
+            print(f"[SessionDispatcher] Erro em '{data_json.get('action')}' ({request_id}): {e}")
+            await self._notify({"request_id": request_id, "error": str(e)})
+
+    def _finished(self, key, request_id, task):
+        entry = self._tasks.get(key)
+        if entry is not None and entry[2] is task:
+            del self._tasks[key]
+        if task.cancelled() and not self._closed:
+            spawn(self._notify({"request_id": request_id, "cancelled": True}))
+
+    async def _notify(self, message: dict):
+        if message["request_id"] is None:
+            return
+        try:
+            await self.send(message)
+        except Exception:
+            pass
+
+    def cancel(self, request_id) -> bool:
+        entry = self._tasks.get(request_id)
+        if entry is None:
+            return False
+        entry[2].cancel()
+        return True
+
+    def cancel_all(self):
+        """Cancela tudo sem avisar o cliente (a websocket já foi fechada)."""
+        self._closed = True
+        for _, _, task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+    def pending(self) -> int:
+        return len(self._tasks)
@@ -0,0 +1,24 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from server.config import BLOCKING_WORKERS
+
+# Pool limitado para tudo que ainda não tem caminho assíncrono,
+# assim uma chamada lenta não trava o event loop do uvicorn.
+executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking")
+
+async def run_blocking(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Leva o contexto atual (ex.: span de tracing da ação) para a thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, partial(context.run, func, *args, **kwargs))
+
+# Referências às tarefas em segundo plano, para não serem coletadas antes de terminar
+_background_tasks = set()
+
+def spawn(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
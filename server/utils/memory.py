@@ -1,14 +1,7 @@
-from collections import defaultdict
+from server.config import SESSION_MAX, SESSION_IDLE_TTL, SESSION_BACKEND
+from server.utils.sessions import SessionStore
+from server.utils.state_backend import create_backend
 
-# Conexões WebSocket por agent_id
-connections = {}
-
-# Cache de dados do agente (loja, posição, estoque...)
-agent_cache = defaultdict(dict)
-
-# Histórico de mensagens por agente (lista de dicts: {"role": "buyer"/"seller", "text": "..."})
-agent_memory = defaultdict(list)
-
-productIndex = {}
-
-stores = {}
\ No newline at end of file
+# Sessões por agent_id: websocket, cache do agente (preferências, loja, estoque...),
+# histórico de mensagens e índice do produto atual
+sessions = SessionStore(max_sessions=SESSION_MAX, idle_ttl=SESSION_IDLE_TTL, backend=create_backend(SESSION_BACKEND))
@@ -0,0 +1,213 @@
+import asyncio
+import sys
+import time
+from server.config import SESSION_EVICT_INTERVAL
+from server.utils.conversation import Conversation
+from server.utils.executor import spawn
+
+# Chaves do cache do agente que fazem parte do estado persistido; qualquer outra
+# é recalculável e fica só no processo
+PERSISTED_KEYS = ("desired_items", "max_prices", "interests")
+
+def deep_sizeof(obj, seen=None) -> int:
+    """
+    Tamanho aproximado em bytes de `obj` e de tudo que ele referencia. Objetos de cache
+    compartilhado (classe com `shared_cache = True`, ex.: linhas do StockCache) não são
+    percorridos: pertencem ao cache, e a referência já conta no contêiner que a guarda.
+    """
+    if getattr(type(obj), "shared_cache", False):
+        return 0
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(deep_sizeof(getattr(obj, name), seen) for name in obj.__slots__ if hasattr(obj, name))
+    return size
+
+class Session:
+    """Estado de um agente conectado. `cache` guarda preferências e resultados por agente."""
+
+    __slots__ = ("agent_id", "websocket", "cache", "memory", "product_index", "created_at", "last_seen", "_prefetch", "_interest_map")
+
+    def __init__(self, agent_id: str, websocket=None):
+        self.agent_id = agent_id
+        self.websocket = websocket
+        self.cache = {}
+        self.memory = Conversation()
+        self.product_index = 0
+        self.created_at = time.monotonic()
+        self.last_seen = self.created_at
+        self._prefetch = None
+        self._interest_map = None
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def reset(self):
+        self.cancel_tasks()
+        self.cache.clear()
+        self.memory.clear()
+
+    def prefetch(self, key, coro):
+        """Inicia `coro` em segundo plano; só a busca mais recente do agente é mantida."""
+        self.cancel_prefetch()
+        self._prefetch = (key, spawn(coro))
+
+    def take_prefetch(self, key):
+        """Tarefa iniciada por `prefetch` com a mesma chave, ou None."""
+        if self._prefetch is None or self._prefetch[0] != key:
+            return None
+        task = self._prefetch[1]
+        self._prefetch = None
+        return task
+
+    def cancel_prefetch(self):
+        if self._prefetch is not None:
+            self._prefetch[1].cancel()
+            self._prefetch = None
+
+    def push_interest_map(self, coro):
+        """Inicia o envio do mapa de interesses; um envio anterior ainda pendente fica obsoleto."""
+        self.cancel_interest_map()
+        self._interest_map = spawn(coro)
+
+    def cancel_interest_map(self):
+        if self._interest_map is not None:
+            self._interest_map.cancel()
+            self._interest_map = None
+
+    def cancel_tasks(self):
+        """Cancela o trabalho em segundo plano da sessão (busca antecipada, mapa de interesses)."""
+        self.cancel_prefetch()
+        self.cancel_interest_map()
+
+    def memory_usage(self) -> int:
+        return deep_sizeof(self.cache) + deep_sizeof(self.memory)
+
+    def to_state(self) -> dict:
+        return {
+            "cache": {key: self.cache[key] for key in PERSISTED_KEYS if key in self.cache},
+            "memory": self.memory.to_state(),
+            "product_index": self.product_index,
+        }
+
+    def load_state(self, state: dict):
+        self.reset()
+        self.cache.update(state.get("cache", {}))
+        self.memory.load_state(state.get("memory", {}))
+        self.product_index = state.get("product_index", 0)
+
+class SessionStore:
+    """
+    Sessões por agent_id, com limite de quantidade e expiração por inatividade.
+    Ao passar de `max_sessions`, a sessão usada há mais tempo é removida.
+    O estado persistível de cada sessão é espelhado em `backend` (ver state_backend.py).
+    """
+
+    def __init__(self, max_sessions: int, idle_ttl: float, backend):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.backend = backend
+        self._sessions = {}
+        self.evicted = 0
+
+    def open(self, agent_id: str, websocket) -> Session:
+        session = self._sessions.get(agent_id)
+        if session is None:
+            while len(self._sessions) >= self.max_sessions:
+                oldest = min(self._sessions.values(), key=lambda s: s.last_seen)
+                self._evict(oldest, "limite de sessões")
+            session = Session(agent_id, websocket)
+            self._sessions[agent_id] = session
+        else:
+            session.websocket = websocket
+        session.touch()
+        return session
+
+    async def restore(self, session: Session) -> bool:
+        """Carrega o estado salvo do agente (por este ou outro worker), se houver."""
+        try:
+            state = await self.backend.load(session.agent_id)
+        except Exception as e:
+            print(f"[SessionStore] Erro ao carregar estado de {session.agent_id}: {e}")
+            return False
+        if state is None:
+            return False
+        session.load_state(state)
+        return True
+
+    async def persist(self, session: Session):
+        try:
+            await self.backend.save(session.agent_id, session.to_state())
+        except Exception as e:
+            print(f"[SessionStore] Erro ao salvar estado de {session.agent_id}: {e}")
+
+    def get(self, agent_id: str):
+        return self._sessions.get(agent_id)
+
+    def cache(self, agent_id: str) -> dict:
+        """Cache do agente; um dict vazio descartável se a sessão não existir mais."""
+        session = self._sessions.get(agent_id)
+        return session.cache if session is not None else {}
+
+    def close(self, agent_id: str, websocket=None):
+        session = self._sessions.get(agent_id)
+        # Uma reconexão pode ter aberto outra websocket para o mesmo agente
+        if session is not None and (websocket is None or session.websocket is websocket):
+            session.cancel_tasks()
+            del self._sessions[agent_id]
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict(self, session: Session, reason: str):
+        self._sessions.pop(session.agent_id, None)
+        session.cancel_tasks()
+        self.evicted += 1
+        print(f"[SessionStore] Sessão {session.agent_id} removida ({reason})")
+        if session.websocket is not None:
+            asyncio.create_task(self._close_websocket(session.websocket))
+
+    @staticmethod
+    async def _close_websocket(websocket):
+        try:
+            await websocket.close(code=1001)
+        except Exception:
+            pass
+
+    def evict_idle(self) -> int:
+        limit = time.monotonic() - self.idle_ttl
+        idle = [s for s in self._sessions.values() if s.last_seen < limit]
+        for session in idle:
+            self._evict(session, "inatividade")
+        return len(idle)
+
+    async def run_evictor(self, interval: float = SESSION_EVICT_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+            try:
+                await self.backend.purge(self.idle_ttl)
+            except Exception as e:
+                print(f"[SessionStore] Erro ao expirar estados salvos: {e}")
+
+    def metrics(self) -> dict:
+        usage = {agent_id: s.memory_usage() for agent_id, s in self._sessions.items()}
+        largest = sorted(usage.items(), key=lambda kv: kv[1], reverse=True)[:10]
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "idle_ttl": self.idle_ttl,
+            "evicted": self.evicted,
+            "backend": type(self.backend).__name__,
+            "memory_bytes": sum(usage.values()),
+            "largest_sessions": [{"agent_id": a, "memory_bytes": b} for a, b in largest],
+        }
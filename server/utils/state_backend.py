@@ -0,0 +1,93 @@
+import json
+import sqlite3
+import threading
+import time
+from server.utils.executor import run_blocking
+
+class StateBackend:
+    """
+    Armazena o estado serializável das sessões (preferências, histórico, produto atual)
+    fora do processo, para que qualquer worker possa retomar um agent_id.
+    """
+
+    async def load(self, agent_id: str):
+        raise NotImplementedError
+
+    async def save(self, agent_id: str, state: dict):
+        raise NotImplementedError
+
+    async def delete(self, agent_id: str):
+        raise NotImplementedError
+
+    async def purge(self, idle_ttl: float) -> int:
+        """Remove estados não atualizados há mais de `idle_ttl` segundos."""
+        raise NotImplementedError
+
+class InMemoryBackend(StateBackend):
+    def __init__(self):
+        self._states = {}
+
+    async def load(self, agent_id):
+        entry = self._states.get(agent_id)
+        return json.loads(entry[1]) if entry is not None else None
+
+    async def save(self, agent_id, state):
+        # Serializa mesmo em memória: garante que o estado é compatível com os outros backends
+        self._states[agent_id] = (time.time(), json.dumps(state, ensure_ascii=False))
+
+    async def delete(self, agent_id):
+        self._states.pop(agent_id, None)
+
+    async def purge(self, idle_ttl):
+        limit = time.time() - idle_ttl
+        expired = [agent_id for agent_id, (updated, _) in self._states.items() if updated < limit]
+        for agent_id in expired:
+            del self._states[agent_id]
+        return len(expired)
+
+class SQLiteBackend(StateBackend):
+    """Arquivo SQLite local em modo WAL, compartilhável entre processos uvicorn."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_state ("
+            "agent_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    async def load(self, agent_id):
+        rows = await run_blocking(self._execute, "SELECT state FROM session_state WHERE agent_id = ?", (agent_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    async def save(self, agent_id, state):
+        await run_blocking(
+            self._execute,
+            "INSERT INTO session_state (agent_id, state, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(agent_id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+            (agent_id, json.dumps(state, ensure_ascii=False), time.time()),
+        )
+
+    async def delete(self, agent_id):
+        await run_blocking(self._execute, "DELETE FROM session_state WHERE agent_id = ?", (agent_id,))
+
+    async def purge(self, idle_ttl):
+        def _purge():
+            with self._lock:
+                return self._conn.execute(
+                    "DELETE FROM session_state WHERE updated_at < ?", (time.time() - idle_ttl,)
+                ).rowcount
+        return await run_blocking(_purge)
+
+def create_backend(spec: str) -> StateBackend:
+    if spec.startswith("sqlite:///"):
+        return SQLiteBackend(spec[len("sqlite:///"):])
+    if spec == "memory":
+        return InMemoryBackend()
+    raise ValueError(f"SESSION_BACKEND desconhecido: {spec!r}")
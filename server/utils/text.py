@@ -0,0 +1,29 @@
+import re
+import unicodedata
+
+STOP_WORDS = {
+    "a", "o", "as", "os", "um", "uma", "uns", "umas", "de", "da", "do", "das", "dos",
+    "e", "em", "no", "na", "nos", "nas", "com", "sem", "para", "pra", "por", "que",
+}
+
+def remove_acentos(texto):
+    return ''.join(
+        c for c in unicodedata.normalize('NFKD', texto)
+        if not unicodedata.combining(c)
+    )
+
+def normalizar(texto) -> str:
+    """Minúsculas e sem acentos, para comparar pedidos com o estoque."""
+    return remove_acentos(str(texto)).lower().strip()
+
+def stem(token: str) -> str:
+    # Plural simples do português: "camisetas" -> "camiseta"
+    if len(token) > 3 and token.endswith("s"):
+        return token[:-1]
+    return token
+
+def tokenize(texto) -> list:
+    return [
+        stem(t) for t in re.findall(r"[a-z0-9]+", normalizar(texto))
+        if t not in STOP_WORDS
+    ]
@@ -0,0 +1,176 @@
+import contextvars
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+from server.config import TRACE_SAMPLE_SIZE, TRACE_MAX_SPANS
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    __slots__ = ("name", "attrs", "trace_id", "parent", "start", "duration")
+
+    def __init__(self, name: str, attrs: dict, parent=None):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        # Spans filhos herdam o request_id da ação websocket que os originou
+        self.trace_id = attrs.get("request_id") or (parent.trace_id if parent else None)
+        self.start = time.time()
+        self.duration = None
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "parent": self.parent.name if self.parent else None,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            **self.attrs,
+        }
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class Tracer:
+    """
+    Registra spans (ações websocket, chains, SQL) e mantém uma amostra das latências
+    de cada nome de span para calcular percentis.
+    """
+
+    def __init__(self, sample_size: int, max_spans: int):
+        self._samples = defaultdict(lambda: deque(maxlen=sample_size))
+        self._counts = defaultdict(int)
+        self._errors = defaultdict(int)
+        self._tokens = defaultdict(lambda: {"prompt_tokens": 0, "completion_tokens": 0})
+        self.recent = deque(maxlen=max_spans)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        span = self.start_span(name, **attrs)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            self.finish(span)
+
+    def start_span(self, name: str, parent=None, **attrs) -> Span:
+        return Span(name, attrs, parent if parent is not None else _current_span.get())
+
+    def finish(self, span: Span):
+        span.duration = time.time() - span.start
+        self._samples[span.name].append(span.duration)
+        self._counts[span.name] += 1
+        if "error" in span.attrs:
+            self._errors[span.name] += 1
+        for key in ("prompt_tokens", "completion_tokens"):
+            if key in span.attrs:
+                self._tokens[span.name][key] += span.attrs[key]
+        self.recent.append(span)
+
+    def summary(self) -> dict:
+        result = {}
+        for name, samples in self._samples.items():
+            values = sorted(samples)
+            entry = {
+                "count": self._counts[name],
+                "errors": self._errors[name],
+                "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+                "p90_ms": round(percentile(values, 0.90) * 1000, 3),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+                "max_ms": round(values[-1] * 1000, 3),
+                "mean_ms": round(sum(values) / len(values) * 1000, 3),
+            }
+            if name in self._tokens:
+                entry.update(self._tokens[name])
+            result[name] = entry
+        return dict(sorted(result.items()))
+
+    def trace(self, trace_id: str) -> list:
+        return [span.to_dict() for span in self.recent if span.trace_id == trace_id]
+
+tracer = Tracer(sample_size=TRACE_SAMPLE_SIZE, max_spans=TRACE_MAX_SPANS)
+
+def token_usage(response) -> tuple:
+    """(prompt_tokens, completion_tokens) de um LLMResult, quando o provedor informa."""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt_tokens += metadata.get("input_tokens", 0)
+            completion_tokens += metadata.get("output_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Cria um span "chain:<run_name>" por invocação de chain e soma nele os tokens
+    de todas as chamadas ao LLM feitas dentro dela.
+    """
+
+    # Executa no próprio event loop, preservando o span atual da ação websocket
+    run_inline = True
+
+    def __init__(self):
+        self._spans = {}
+        self._roots = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            name = kwargs.get("name") or (serialized or {}).get("name", "chain")
+            self._spans[run_id] = tracer.start_span(f"chain:{name}")
+            self._roots[run_id] = run_id
+        else:
+            self._roots[run_id] = self._roots.get(parent_run_id, parent_run_id)
+
+    def _on_llm_start(self, run_id, parent_run_id):
+        self._roots[run_id] = self._roots.get(parent_run_id, parent_run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._on_llm_start(run_id, parent_run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._on_llm_start(run_id, parent_run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        root = self._roots.pop(run_id, None)
+        span = self._spans.get(root)
+        if span is None:
+            return
+        prompt_tokens, completion_tokens = token_usage(response)
+        span.attrs["prompt_tokens"] = span.attrs.get("prompt_tokens", 0) + prompt_tokens
+        span.attrs["completion_tokens"] = span.attrs.get("completion_tokens", 0) + completion_tokens
+        span.attrs["llm_calls"] = span.attrs.get("llm_calls", 0) + 1
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._roots.pop(run_id, None)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end_chain(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end_chain(run_id, error)
+
+    def _end_chain(self, run_id, error=None):
+        self._roots.pop(run_id, None)
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            if error is not None:
+                span.attrs["error"] = type(error).__name__
+            tracer.finish(span)
+
+tracing_callbacks = [TracingCallbackHandler()]
+
+def traced(chain, name: str):
+    """Nomeia a chain e liga o tracing a todas as suas execuções."""
+    return chain.with_config(run_name=name, callbacks=tracing_callbacks)
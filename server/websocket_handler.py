@@ -1,183 +1,356 @@
 import json
+import math
 from fastapi import WebSocket, WebSocketDisconnect
-from server.utils.memory import connections, agent_cache, agent_memory, productIndex, stores
-from server.llm.chains import buyer_chain, seller_chain, resumo_chain, parser, interestChecker_chain, first_interest_chain
-from server.db.queries import get_store_tipo, multi_table_search, find_all_stores
+from langchain_core.messages import AIMessage
+from server.utils.memory import sessions
+from server.llm.chains import buyer_chain, buyer_stream_chain, seller_chain, resumo_chain, parser, first_interest_chain
+from server.llm.streaming import stream_answer, partial_answer
+from server.llm.interest_cache import check_interest, precompute_interests
+from server.db.queries import get_store_tipo, multi_table_search, get_store_coordinates
+from server.db.directory import store_directory
+from server.db.store_map import store_map
+from server.utils.tracing import tracer
+from server.utils.text import remove_acentos, normalizar
+from server.utils.executor import spawn
+from server.utils.dispatcher import SessionDispatcher
+from server.llm.admission import llm_priority, INTERACTIVE, NORMAL, BACKGROUND
+from server.config import INTEREST_PRECOMPUTE, STOCK_PREFETCH
+
+async def summarize_history(text: str) -> str:
+    with llm_priority(BACKGROUND):
+        result = await resumo_chain.ainvoke({"conversa": text})
+    return result.content
+
+def compact_history(session):
+    # O resumo roda em segundo plano para não atrasar a resposta atual
+    conversation = session.memory
+    if conversation.needs_compaction():
+        spawn(conversation.compact(summarize_history))
+
+async def push_interest_map(websocket: WebSocket, interests, request_id):
+    # Avalia todas as lojas de uma vez e envia o mapa loja -> interesse ao cliente
+    with llm_priority(BACKGROUND):
+        answers = await precompute_interests(interests, store_directory.snapshot().keys())
+    try:
+        await websocket.send_text(json.dumps({
+            "action": "interestMap",
+            "request_id": request_id,
+            "interests": {store: answer == "yes" for store, answer in answers.items()},
+        }))
+    except Exception as e:
+        print(f"[push_interest_map] Cliente não recebeu o mapa de interesses: {e}")
+
+async def stock_info_for(session, desired_item: str, store_description: str) -> str:
+    # Reaproveita a busca iniciada no guide_request, se foi para o mesmo item e loja
+    task = session.take_prefetch((desired_item, store_description))
+    if task is not None:
+        try:
+            return await task
+        except Exception as e:
+            print(f"[stock_info_for] Busca antecipada falhou, refazendo: {e}")
+    return await multi_table_search(desired_item, session.agent_id, store_description)
+
+def parse_position(value) -> tuple:
+    # Aceita {"x": .., "y": .., "z": ..} (Vector3 do Unity) ou [x, y, z]
+    try:
+        if isinstance(value, dict):
+            value = (value["x"], value["y"], value["z"])
+        x, y, z = (float(v) for v in value)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"Posição inválida: {value!r}")
+    if not all(math.isfinite(v) for v in (x, y, z)):
+        raise ValueError(f"Posição inválida: {value!r}")
+    return x, y, z
+
+def describe_stores(matches) -> list:
+    # [(numero, distância)] do SpatialGrid -> lojas com tipo, id e coordenadas para o cliente
+    by_number = {int(numero): (tipo, store_id) for tipo, (numero, store_id) in store_directory.snapshot().items()}
+    grid = store_map.snapshot()
+    stores = []
+    for numero, distance in matches:
+        tipo, store_id = by_number.get(numero, (None, None))
+        x, y, z = grid.coordinates(numero)
+        stores.append({"numero": numero, "tipo": tipo, "id": store_id, "x": x, "y": y, "z": z, "distancia": round(distance, 4)})
+    return stores
+
+# Ações que alteram o estado persistido da sessão (preferências, histórico, produto atual)
+STATEFUL_ACTIONS = {"start", "nextProduct", "setBuyerPreferences", "buyer_message", "firstInterestMessage", "store_request", "guide_request"}
+
+async def handle_message(session, websocket: WebSocket, data_json: dict):
+    agent_id = session.agent_id
+    action = data_json.get("action")
+    prompt = data_json.get("prompt")
+    stream = bool(data_json.get("stream", False))
+
+    if action == "start":
+        session.reset()
+        # O diretório é carregado no startup; só tenta de novo se aquela carga falhou
+        if not store_directory.snapshot():
+            await store_directory.refresh_if_changed()
+        if not len(store_map.snapshot()):
+            await store_map.refresh_if_changed()
+        await websocket.send_text(json.dumps({"message": f"Sessão iniciada para agent_id={agent_id}"}))
+
+    elif action == "nextProduct":
+        session.product_index += 1
+
+    elif action == "buyer_interested":
+        request_id = data_json.get("request_id", "undefined")
+        answer = await check_interest(prompt, session.cache["interests"])
+        result = AIMessage(content=answer)
+
+        response_data = result.dict()
+        response_data["request_id"] = request_id
+        await websocket.send_text(json.dumps(response_data))
+
+    elif action == "buyer_message":
+        request_id = data_json.get("request_id", "undefined")
+        history_text = session.memory.render()
+
+        inputs = {
+            "history": history_text,
+            "seller_utterance": prompt,
+            "buyer_interests": session.cache["interests"],
+            "desired_item": session.cache["desired_items"][session.product_index],
+            "max_price": session.cache["max_prices"][session.product_index]
+        }
+
+        if stream:
+            message = await stream_answer(buyer_stream_chain, inputs, websocket, request_id, extract=partial_answer)
+            result = parser.parse(message.content)
+        else:
+            result = await buyer_chain.ainvoke(inputs)
+
+        print(f"[INFO] Enviando resposta para o cliente: {result.final_offer}")
+
+        session.memory.append("seller", prompt)
+        session.memory.append("buyer", result.answer)
+        compact_history(session)
+
+        response_data = result.dict()
+        response_data["request_id"] = request_id
+        if stream:
+            response_data["done"] = True
+        await websocket.send_text(json.dumps(response_data))
+
+    elif action == "firstInterestMessage":
+        request_id = data_json.get("request_id", "undefined")
+        history_text = session.memory.render()
+
+        inputs = {
+            "history": history_text,
+            "buyer_interests": session.cache["interests"],
+            "desired_item": session.cache["desired_items"][session.product_index],
+            "max_price": session.cache["max_prices"][session.product_index]
+        }
+
+        if stream:
+            result = await stream_answer(first_interest_chain, inputs, websocket, request_id)
+        else:
+            result = await first_interest_chain.ainvoke(inputs)
+
+        session.memory.append("seller", prompt)
+        session.memory.append("buyer", result.content)
+        compact_history(session)
+
+        response_data = result.dict()
+        response_data["request_id"] = request_id
+        response_data["answer"] = result.content
+        if stream:
+            response_data["done"] = True
+        await websocket.send_text(json.dumps(response_data))
+
+
+    elif action == "store_request":
+        request_id = data_json.get("request_id", "undefined")
+        store_description = data_json.get("store_description", "Nenhuma descrição de loja encontrada.")
+        stock_info = await stock_info_for(session, session.cache["desired_items"][session.product_index], store_description)
+
+        history_text = session.memory.render()
+
+        inputs = {
+            "buyer_utterance": prompt,
+            "history": history_text,
+            "stock_info": stock_info
+        }
+
+        if stream:
+            result = await stream_answer(seller_chain, inputs, websocket, request_id)
+        else:
+            result = await seller_chain.ainvoke(inputs)
+
+        session.memory.append("buyer", prompt)
+        session.memory.append("seller", result.content)
+        compact_history(session)
+
+        response_data = result.dict()
+        response_data["request_id"] = request_id
+        response_data["answer"] = result.content
+        if stream:
+            response_data["done"] = True
+        await websocket.send_text(json.dumps(response_data))
+
+    elif action == "get_summary":
+        request_id = data_json.get("request_id", "undefined")
+        conversa_texto = data_json.get("conversa", "Nenhuma conversa encontrada.")
+
+        result = await resumo_chain.ainvoke({"conversa": conversa_texto})
+        response_data = {"answer": result.content, "request_id": request_id}
+
+        await websocket.send_text(json.dumps(response_data))
+
+    elif action == "guide_request":
+        request_id = data_json.get("request_id", "undefined")
+
+        try:
+            desired_item = session.cache["desired_items"][session.product_index]
+            store_tipo = await get_store_tipo(desired_item)
+            stores = store_directory.snapshot()
+            store_id = stores[store_tipo][1]
+            store_number = stores[store_tipo][0]
+
+            answer = (
+                f"Loja encontrada: id={store_id}, tipo='{store_tipo}', número={store_number}"
+            )
+
+            print(f"[INFO] Enviando resposta para o cliente: {answer}")
+            session.memory.append("guide", answer)
+
+            # Consulta o estoque enquanto o avatar caminha; o store_request só aguarda o resultado
+            if STOCK_PREFETCH:
+                session.prefetch((desired_item, store_tipo), multi_table_search(desired_item, agent_id, store_tipo))
+
+            await websocket.send_text(json.dumps({
+                "request_id": request_id,
+                "answer": answer,
+            }))
+
+        except ValueError as e:
+            await websocket.send_text(json.dumps({
+                "request_id": request_id,
+                "answer": str(e),
+            }))
+
+
+    elif action == "setBuyerPreferences":
+        # Um mapa de interesses ainda em cálculo seria do perfil anterior
+        session.cancel_interest_map()
+        try:
+            session.product_index = 0
+            desired_items = data_json.get("desired_item", [])
+            max_prices = data_json.get("max_price", [])
+            interests = data_json.get("interests")
+
+            if isinstance(desired_items, str):
+                desired_items = [desired_items]
+            if isinstance(max_prices, (int, float, str)):
+                max_prices = [float(max_prices)]
+
+            if isinstance(desired_items, dict) and "list" in desired_items:
+                desired_items = desired_items["list"]
+            if isinstance(max_prices, dict) and "list" in max_prices:
+                max_prices = max_prices["list"]
+
+            if len(desired_items) != len(max_prices):
+                raise ValueError("Número de produtos e preços não corresponde.")
+
+            session.cache["desired_items"] = desired_items
+            session.cache["max_prices"] = max_prices
+            session.cache["interests"] = interests
+            print(session.cache["interests"])
+
+            await websocket.send_text(json.dumps({
+                "response": f"Preferências salvas: itens={desired_items}, preços={max_prices}"
+            }))
+
+            # Avalia todas as lojas para este perfil em segundo plano, antes do avatar passar por elas
+            if INTEREST_PRECOMPUTE and interests:
+                session.push_interest_map(push_interest_map(websocket, interests, data_json.get("request_id", "undefined")))
+
+        except ValueError as e:
+            await websocket.send_text(json.dumps({"response": str(e)}))
+
+    elif action == "store_position":
+        request_id = data_json.get("request_id", "undefined")
+        store_number = data_json.get("numero")
+        if store_number is None and data_json.get("tipo"):
+            store = store_directory.snapshot().get(remove_acentos(data_json["tipo"]))
+            store_number = store[0] if store else None
+        if store_number is None:
+            raise ValueError("Informe o 'numero' ou o 'tipo' de uma loja existente.")
+        coords = await get_store_coordinates(store_number)
+        await websocket.send_text(json.dumps({
+            "request_id": request_id,
+            "numero": store_number,
+            "position": dict(zip("xyz", coords)) if coords else None,
+        }))
+
+    elif action == "nearest_store":
+        request_id = data_json.get("request_id", "undefined")
+        position = parse_position(data_json.get("position"))
+        matches = store_map.snapshot().nearest(position, int(data_json.get("k", 1)))
+        await websocket.send_text(json.dumps({"request_id": request_id, "stores": describe_stores(matches)}))
+
+    elif action == "stores_nearby":
+        request_id = data_json.get("request_id", "undefined")
+        position = parse_position(data_json.get("position"))
+        matches = store_map.snapshot().within(position, float(data_json.get("radius", 0)))
+        await websocket.send_text(json.dumps({"request_id": request_id, "stores": describe_stores(matches)}))
+
+    if action in STATEFUL_ACTIONS:
+        await sessions.persist(session)
+
+# Prioridade das chamadas ao LLM de cada ação: o diálogo em cena passa à frente do resto
+ACTION_PRIORITY = {
+    "buyer_message": INTERACTIVE,
+    "firstInterestMessage": INTERACTIVE,
+    "store_request": INTERACTIVE,
+    "guide_request": INTERACTIVE,
+    "buyer_interested": NORMAL,
+    "get_summary": NORMAL,
+}
+
+# Ações que só leem a sessão (ou o mapa de lojas): rodam em paralelo com as demais da mesma websocket
+CONCURRENT_ACTIONS = {"buyer_interested", "get_summary", "store_position", "nearest_store", "stores_nearby"}
+# Ações que as concorrentes esperam terminar: definem as preferências que elas leem
+BARRIER_ACTIONS = {"start", "setBuyerPreferences"}
+def interest_target(data_json: dict) -> str:
+    return normalizar(data_json.get("prompt") or "")
+
+# Uma nova checagem de interesse na mesma loja torna obsoleta a anterior ainda pendente;
+# checagens de lojas diferentes seguem todas em paralelo
+SUPERSEDING_ACTIONS = {"buyer_interested": interest_target}
 
 async def websocket_endpoint(websocket: WebSocket, agent_id: str):
     await websocket.accept()
-    connections[agent_id] = websocket
-    agent_cache[agent_id].clear()
-    agent_memory[agent_id].clear()
+    session = sessions.open(agent_id, websocket)
+    # Retoma o estado salvo por este ou outro worker (reconexão, reinício)
+    if not await sessions.restore(session):
+        session.reset()
+
+    async def dispatch(data_json: dict):
+        action = data_json.get("action")
+        with tracer.span(f"ws:{action}", agent_id=agent_id, request_id=data_json.get("request_id")), \
+                llm_priority(ACTION_PRIORITY.get(action, NORMAL)):
+            await handle_message(session, websocket, data_json)
+
+    async def send(message: dict):
+        await websocket.send_text(json.dumps(message))
+
+    dispatcher = SessionDispatcher(dispatch, send, CONCURRENT_ACTIONS, SUPERSEDING_ACTIONS, BARRIER_ACTIONS)
 
     try:
         while True:
             data = await websocket.receive_text()
+            session.touch()
             print(">> Conteúdo recebido:", repr(data))
             data = data.replace('\n', '\\n')
             data_json = json.loads(data)
-            action = data_json.get("action")
-            prompt = data_json.get("prompt")
-
-            if action == "start":
-                agent_cache[agent_id].clear()
-                agent_memory[agent_id].clear()  
-                stores.clear()
-                find_all_stores()
-                await websocket.send_text(json.dumps({"message": f"Sessão iniciada para agent_id={agent_id}"}))
-
-            elif action == "nextProduct":
-                productIndex[agent_id] += 1
-
-            elif action == "buyer_interested":
-                request_id = data_json.get("request_id", "undefined")
-                result = interestChecker_chain.invoke({
-                    "storeDescription": prompt,
-                    "buyerInterest": agent_cache[agent_id]["interests"],
-                    "format_instructions": parser.get_format_instructions()
-                })
-
-                response_data = result.dict()
-                response_data["request_id"] = request_id
-                await websocket.send_text(json.dumps(response_data))
-
-            elif action == "buyer_message":
-                request_id = data_json.get("request_id", "undefined")
-                memory_msgs = agent_memory[agent_id]
-                history_text = "\n".join(f"{m['role'].upper()}: {m['text']}" for m in memory_msgs)
-
-                result = buyer_chain.invoke({
-                    "history": history_text,
-                    "seller_utterance": prompt,
-                    "buyer_interests": agent_cache[agent_id]["interests"],
-                    "desired_item": agent_cache[agent_id]["desired_items"][productIndex[agent_id]],
-                    "max_price": agent_cache[agent_id]["max_prices"][productIndex[agent_id]],
-                    "format_instructions": parser.get_format_instructions()
-                })
-
-                print(f"[INFO] Enviando resposta para o cliente: {result.final_offer}")
-
-                agent_memory[agent_id].append({"role": "seller", "text": prompt})
-                agent_memory[agent_id].append({"role": "buyer", "text": result.answer})
-
-                response_data = result.dict()
-                response_data["request_id"] = request_id
-                await websocket.send_text(json.dumps(response_data))
-
-            elif action == "firstInterestMessage":
-                request_id = data_json.get("request_id", "undefined")
-                memory_msgs = agent_memory[agent_id]
-                history_text = "\n".join(f"{m['role'].upper()}: {m['text']}" for m in memory_msgs)
-
-                result = first_interest_chain.invoke({
-                    "history": history_text,
-                    "buyer_interests": agent_cache[agent_id]["interests"],
-                    "desired_item": agent_cache[agent_id]["desired_items"][productIndex[agent_id]],
-                    "max_price": agent_cache[agent_id]["max_prices"][productIndex[agent_id]]
-                })
-
-                agent_memory[agent_id].append({"role": "seller", "text": prompt})
-                agent_memory[agent_id].append({"role": "buyer", "text": result.content})
-
-                response_data = result.dict()
-                response_data["request_id"] = request_id
-                response_data["answer"] = result.content
-                await websocket.send_text(json.dumps(response_data))
-
-
-            elif action == "store_request":
-                request_id = data_json.get("request_id", "undefined")
-                store_description = data_json.get("store_description", "Nenhuma descrição de loja encontrada.")
-                stock_info = multi_table_search(agent_cache[agent_id]["desired_items"][productIndex[agent_id]], agent_id, store_description)
-
-                history_text = "\n".join(f"{m['role'].upper()}: {m['text']}" for m in agent_memory[agent_id])
-
-                result = seller_chain.invoke({
-                    "buyer_utterance": prompt,
-                    "history": history_text,
-                    "stock_info": stock_info
-                })
-
-                agent_memory[agent_id].append({"role": "buyer", "text": prompt})
-                agent_memory[agent_id].append({"role": "seller", "text": result.content})
-
-                response_data = result.dict()
-                response_data["request_id"] = request_id
-                response_data["answer"] = result.content
-                await websocket.send_text(json.dumps(response_data))
-
-            elif action == "get_summary":
-                request_id = data_json.get("request_id", "undefined")
-                conversa_texto = data_json.get("conversa", "Nenhuma conversa encontrada.")
-
-                result = resumo_chain.invoke({"conversa": conversa_texto})
-                response_data = {"answer": result.content, "request_id": request_id}
-
-                await websocket.send_text(json.dumps(response_data))
-
-            elif action == "guide_request":
-                request_id = data_json.get("request_id", "undefined")
-
-                try:
-                    desired_item = agent_cache[agent_id]["desired_items"][productIndex[agent_id]]
-                    store_tipo = get_store_tipo(desired_item)
-                    store_id = stores[store_tipo][1]
-                    store_number = stores[store_tipo][0]
-
-                    answer = (
-                        f"Loja encontrada: id={store_id}, tipo='{store_tipo}', número={store_number}"
-                    )
-
-                    print(f"[INFO] Enviando resposta para o cliente: {answer}")
-                    agent_memory[agent_id].append({"role": "guide", "text": answer})
-
-                    await websocket.send_text(json.dumps({
-                        "request_id": request_id,
-                        "answer": answer,
-                    }))
-
-                except ValueError as e:
-                    await websocket.send_text(json.dumps({
-                        "request_id": request_id,
-                        "answer": str(e),
-                    }))
-
-
-            elif action == "setBuyerPreferences":
-                try:
-                    productIndex[agent_id] = 0
-                    desired_items = data_json.get("desired_item", [])
-                    max_prices = data_json.get("max_price", [])
-                    interests = data_json.get("interests")
-
-                    if isinstance(desired_items, str):
-                        desired_items = [desired_items]
-                    if isinstance(max_prices, (int, float, str)):
-                        max_prices = [float(max_prices)]
-
-                    if isinstance(desired_items, dict) and "list" in desired_items:
-                        desired_items = desired_items["list"]
-                    if isinstance(max_prices, dict) and "list" in max_prices:
-                        max_prices = max_prices["list"]
-
-                    if len(desired_items) != len(max_prices):
-                        raise ValueError("Número de produtos e preços não corresponde.")
-
-                    agent_cache[agent_id]["desired_items"] = desired_items
-                    agent_cache[agent_id]["max_prices"] = max_prices
-                    agent_cache[agent_id]["interests"] = interests
-                    print(agent_cache[agent_id]["interests"])
-
-                    await websocket.send_text(json.dumps({
-                        "response": f"Preferências salvas: itens={desired_items}, preços={max_prices}"
-                    }))
-                
-                except ValueError as e:
-                    await websocket.send_text(json.dumps({"response": str(e)}))
-
+            await dispatcher.submit(data_json)
 
     except WebSocketDisconnect:
         print(f"[INFO] Desconectado: {agent_id}")
-        connections.pop(agent_id, None)
-        agent_cache.pop(agent_id, None)
-        agent_memory.pop(agent_id, None)
\ No newline at end of file
+    finally:
+        # Também num frame inválido ou erro de leitura: nada continua rodando para uma websocket morta
+        dispatcher.cancel_all()
+        sessions.close(agent_id, websocket)
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Os testes importam o pacote `server` a partir da raiz do repositório
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
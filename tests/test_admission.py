@@ -0,0 +1,38 @@
+import asyncio
+import time
+from server.llm.admission import AdmissionController, NORMAL
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 10))
+
+async def call(controller, model):
+    await controller.acquire(model, NORMAL)
+    controller.release()
+
+def test_rate_limit_pause_does_not_throttle_unlimited_model():
+    async def scenario():
+        controller = AdmissionController(0, {}, 0, 10, backoff=0.1)
+        controller.rate_limit_hit("gpt")
+        start = time.monotonic()
+        for _ in range(12):
+            await call(controller, "gpt")
+        elapsed = time.monotonic() - start
+        assert 0.09 <= elapsed < 0.5
+
+    run(scenario())
+
+def test_long_pause_does_not_delay_other_model():
+    async def scenario():
+        controller = AdmissionController(0, {"a": 60, "b": 600}, 0, 1, backoff=5)
+        await call(controller, "a")
+        await call(controller, "b")
+        controller.rate_limit_hit("a")
+        paused = asyncio.create_task(call(controller, "a"))
+        await asyncio.sleep(0.01)
+
+        start = time.monotonic()
+        await call(controller, "b")
+        assert time.monotonic() - start < 0.5
+        paused.cancel()
+
+    run(scenario())
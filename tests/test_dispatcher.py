@@ -0,0 +1,83 @@
+import asyncio
+from server.utils.dispatcher import SessionDispatcher
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+def make_dispatcher(**kwargs):
+    sent, handled, release = [], [], asyncio.Event()
+
+    async def handler(data_json):
+        if data_json.get("block"):
+            await release.wait()
+        handled.append(data_json.get("request_id"))
+
+    async def send(message):
+        sent.append(message)
+
+    dispatcher = SessionDispatcher(handler, send, concurrent={"check"}, barriers={"start"}, **kwargs)
+    return dispatcher, sent, handled, release
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_cancel_request_queued_behind_another():
+    async def scenario():
+        dispatcher, sent, handled, release = make_dispatcher()
+        await dispatcher.submit({"action": "store", "request_id": "s1", "block": True})
+        await dispatcher.submit({"action": "store", "request_id": "s2"})
+        await settle()
+
+        await dispatcher.submit({"action": "cancel", "request_id": "s2"})
+        await settle()
+        assert {"request_id": "s2", "cancelled": True} in sent
+        assert "s2" not in dispatcher._tasks
+
+        # O mesmo request_id reutilizado volta a ser cancelável
+        await dispatcher.submit({"action": "store", "request_id": "s2"})
+        assert "s2" in dispatcher._tasks
+
+        release.set()
+        await settle()
+        assert handled == ["s1", "s2"]
+        assert dispatcher.pending() == 0
+
+    run(scenario())
+
+def test_cancel_right_after_submit():
+    async def scenario():
+        dispatcher, sent, handled, _ = make_dispatcher()
+        await dispatcher.submit({"action": "check", "request_id": "c1"})
+        await dispatcher.submit({"action": "cancel", "request_id": "c1"})
+        await settle()
+        assert sent == [{"request_id": "c1", "cancelled": True}]
+        assert handled == [] and dispatcher.pending() == 0
+
+    run(scenario())
+
+def test_supersede_only_same_target():
+    async def scenario():
+        dispatcher, sent, handled, release = make_dispatcher(superseding={"check": lambda m: m["prompt"]})
+        await dispatcher.submit({"action": "check", "request_id": "i1", "prompt": "Skate", "block": True})
+        await dispatcher.submit({"action": "check", "request_id": "i2", "prompt": "Livraria", "block": True})
+        await dispatcher.submit({"action": "check", "request_id": "i3", "prompt": "Skate", "block": True})
+        await settle()
+        assert sent == [{"request_id": "i1", "cancelled": True}]
+
+        release.set()
+        await settle()
+        assert sorted(handled) == ["i2", "i3"]
+
+    run(scenario())
+
+def test_cancel_all_does_not_notify():
+    async def scenario():
+        dispatcher, sent, _, _ = make_dispatcher()
+        await dispatcher.submit({"action": "store", "request_id": "s1", "block": True})
+        await settle()
+        dispatcher.cancel_all()
+        await settle()
+        assert sent == [] and dispatcher.pending() == 0
+
+    run(scenario())
@@ -0,0 +1,39 @@
+from server.llm.prompts import buyer_prompt, first_interest_prompt, seller_prompt, prompt_interestChecker
+
+SESSAO_A = {
+    "desired_item": "camiseta branca",
+    "max_price": 80,
+    "buyer_interests": "skate, música",
+    "history": "Buyer: Oi\nSeller: Olá!",
+    "seller_utterance": "Temos camisetas a R$ 50",
+    "stock_info": " - camiseta (branca), qtd=3, R$50",
+    "buyer_utterance": "Quanto custa?",
+}
+SESSAO_B = {
+    "desired_item": "livro de ficção",
+    "max_price": 120.5,
+    "buyer_interests": "comida",
+    "history": "",
+    "seller_utterance": "Bom dia",
+    "stock_info": "(Nenhum item encontrado ou recomendado)",
+    "buyer_utterance": "Vocês têm Duna?",
+}
+
+def render(prompt, sessao):
+    return prompt.format_messages(**{k: sessao[k] for k in prompt.input_variables})
+
+def test_chat_prompt_prefix_is_byte_identical_across_sessions():
+    for prompt in (buyer_prompt, first_interest_prompt, seller_prompt):
+        a, b = render(prompt, SESSAO_A), render(prompt, SESSAO_B)
+        assert a[0].content.encode("utf-8") == b[0].content.encode("utf-8")
+        # Nada da sessão pode vazar para o prefixo fixo
+        for valor in SESSAO_A.values():
+            assert str(valor) not in a[0].content
+        assert a[-1].content != b[-1].content
+
+def test_interest_checker_instructions_come_before_variables():
+    a = prompt_interestChecker.format(storeDescription="Skate", buyerInterest="esportes")
+    b = prompt_interestChecker.format(storeDescription="Livraria", buyerInterest="comida")
+    prefixo = prompt_interestChecker.template.split("{")[0]
+    assert a.startswith(prefixo) and b.startswith(prefixo)
+    assert "Nenhuma outra resposta será aceita." in prefixo
@@ -0,0 +1,24 @@
+from server.db.store_stock import StoreStock
+from server.utils.sessions import Session, deep_sizeof
+
+ITEMS = [
+    {"produto": f"camiseta {i}", "tipo": "branca", "material": "algodão" * 20, "qtd": 3, "preco": 10.0 + i}
+    for i in range(500)
+]
+
+def test_shared_stock_is_not_charged_to_sessions():
+    stock = StoreStock(ITEMS)
+    session = Session("a1")
+    vazia = session.memory_usage()
+
+    session.cache["encontrados"] = list(stock.items)
+    # Só a lista de referências: cada linha é do cache de estoque
+    assert session.memory_usage() - vazia <= deep_sizeof(list(range(len(ITEMS))))
+    assert deep_sizeof(stock) == 0
+    assert deep_sizeof([dict(item) for item in ITEMS]) > 100 * len(ITEMS)
+
+def test_stock_rows_behave_like_dicts():
+    stock = StoreStock(ITEMS[:3])
+    row = stock.items[0]
+    assert row == ITEMS[0] and row["preco"] == 10.0 and dict(row) == ITEMS[0]
+    assert [r["preco"] for r in stock.prices.band(10.5, 11.5)] == [11.0]
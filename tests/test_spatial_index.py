@@ -0,0 +1,36 @@
+import math
+import random
+import time
+from server.db.spatial_index import SpatialGrid
+
+def brute_force(positions, point, k):
+    return sorted(math.dist(coords, point) for coords in positions.values())[:k]
+
+def mall(n=200, seed=1):
+    rng = random.Random(seed)
+    return {i * 100: (rng.uniform(0, 50), rng.choice([0.0, 4.0]), rng.uniform(0, 50)) for i in range(n)}
+
+def test_nearest_and_within_match_brute_force():
+    positions = mall()
+    rng = random.Random(2)
+    for cell_size in (0, 0.5, 5, 100):
+        grid = SpatialGrid(positions, cell_size)
+        for _ in range(50):
+            point = (rng.uniform(-20, 70), rng.uniform(-2, 6), rng.uniform(-20, 70))
+            k = rng.randint(1, 6)
+            assert [round(d, 9) for _, d in grid.nearest(point, k)] == [round(d, 9) for d in brute_force(positions, point, k)]
+            radius = rng.uniform(0, 15)
+            expected = {n for n, coords in positions.items() if math.dist(coords, point) <= radius}
+            assert {n for n, _ in grid.within(point, radius)} == expected
+
+def test_far_away_point_is_fast():
+    positions = mall()
+    grid = SpatialGrid(positions, 0.5)
+    for point in ((1e6, 0, 1e6), (3e7, 0, 3e7), (-3e7, 1e5, 25)):
+        start = time.perf_counter()
+        result = grid.nearest(point, 3)
+        assert time.perf_counter() - start < 0.05
+        assert [round(d, 6) for _, d in result] == [round(d, 6) for d in brute_force(positions, point, 3)]
+        start = time.perf_counter()
+        assert grid.within(point, 10) == []
+        assert time.perf_counter() - start < 0.05
@@ -0,0 +1,59 @@
+import asyncio
+from server.db.stock_cache import StockCache
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+def counting_loader():
+    loads = []
+
+    async def loader():
+        loads.append(len(loads) + 1)
+        version = loads[-1]
+        await asyncio.sleep(0.05)
+        return version
+
+    return loader, loads
+
+def test_invalidate_during_load_discards_stale_result():
+    async def scenario():
+        cache = StockCache(ttl=60, max_entries=4)
+        loader, loads = counting_loader()
+        stale = asyncio.create_task(cache.get(1, loader))
+        await asyncio.sleep(0.01)
+        cache.invalidate(1)
+
+        assert await stale == 1
+        assert await cache.get(1, loader) == 2
+        assert await cache.get(1, loader) == 2
+        assert loads == [1, 2]
+
+    run(scenario())
+
+def test_invalidate_all_during_load():
+    async def scenario():
+        cache = StockCache(ttl=60, max_entries=4)
+        loader, _ = counting_loader()
+        stale = asyncio.create_task(cache.get(7, loader))
+        await asyncio.sleep(0.01)
+        cache.invalidate()
+
+        assert await stale == 1
+        assert await cache.get(7, loader) == 2
+
+    run(scenario())
+
+def test_cancelled_caller_does_not_strand_waiters():
+    async def scenario():
+        cache = StockCache(ttl=60, max_entries=4)
+        loader, loads = counting_loader()
+        first = asyncio.create_task(cache.get(1, loader))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(cache.get(1, loader))
+        await asyncio.sleep(0.01)
+        first.cancel()
+
+        assert await second == 1
+        assert loads == [1]
+
+    run(scenario())